@@ -2,7 +2,7 @@
 import os
 from apscheduler.schedulers.blocking import BlockingScheduler
 from predictionprice.derivedpoloniex import ExchangeTradePoloniex
-from predictionprice import PredictionPrice
+from predictionprice import BotPipeline
 
 myGmailAddress = "********@gmail.com"
 myGmailAddressPassword = "************"
@@ -19,52 +19,52 @@ backTestOptParams = [
 
 basicCoin = "BTC"
 workingDirPath = os.path.dirname(os.path.abspath(__file__))
+optimizationDeadline = 60 * 60 * 23  # Seconds to finish the optimization before the next routine
 
 
-def botRoutine():
-
-    ppList = []
+def fitBalance(ppList):
     tomorrwPricePrediction = []
-
-    # --- Prediction price and back test
-    for coinIndex in range(len(coins)):
-        pp = PredictionPrice(currentPair=basicCoin + "_" + coins[coinIndex], workingDirPath=workingDirPath,
-                             gmailAddress=myGmailAddress, gmailAddressPassword=myGmailAddressPassword,
-                             backTestOptNumFeatureMin=backTestOptParams[coinIndex][0],
-                             backTestOptNumFeatureMax=backTestOptParams[coinIndex][1],
-                             backTestOptNumTrainSampleMin=backTestOptParams[coinIndex][2],
-                             backTestOptNumTrainSampleMax=backTestOptParams[coinIndex][3])
-
-        pp.fit(pp.appreciationRate_, pp.quantizer(pp.appreciationRate_))
-        pp.sendMail(pp.getSummary())
-        ppList.append(pp)
+    for pp in ppList:
         if pp.backTestResult_["AccuracyRateUp"].values > 0.5:
             tomorrwPricePrediction.append(pp.tomorrowPriceFlag_)
         else:
             tomorrwPricePrediction.append(False)
 
-    # --- Fit balance
+    polo = ExchangeTradePoloniex(APIKey=myAPIKey, Secret=mySecret, workingDirPath=workingDirPath,
+                          gmailAddress=myGmailAddress, gmailAddressPassword=myGmailAddressPassword,
+                          coins=coins, buySigns=tomorrwPricePrediction)
     try:
-        polo = ExchangeTradePoloniex(APIKey=myAPIKey, Secret=mySecret, workingDirPath=workingDirPath,
-                              gmailAddress=myGmailAddress, gmailAddressPassword=myGmailAddressPassword,
-                              coins=coins, buySigns=tomorrwPricePrediction)
         polo.savePoloniexBalanceToCsv()
         polo.fitBalance()
         polo.sendMailBalance(polo.getSummary())
         polo.savePoloniexBalanceToCsv()
     except:
         pass
+    return polo
+
+
+def botRoutine():
+    # --- Predict all coins in parallel, trade as soon as all signs are ready and optimize in the background
+    pipeline = BotPipeline([basicCoin + "_" + coin for coin in coins],
+                           pairKwargs=[{"backTestOptNumFeatureMin": backTestOptParams[coinIndex][0],
+                                        "backTestOptNumFeatureMax": backTestOptParams[coinIndex][1],
+                                        "backTestOptNumTrainSampleMin": backTestOptParams[coinIndex][2],
+                                        "backTestOptNumTrainSampleMax": backTestOptParams[coinIndex][3]}
+                                       for coinIndex in range(len(coins))],
+                           optimizationDeadline=optimizationDeadline,
+                           optimizationKwargs={"incremental": True},
+                           workingDirPath=workingDirPath,
+                           gmailAddress=myGmailAddress, gmailAddressPassword=myGmailAddressPassword)
+    ppList, polo, optimizationStatus = pipeline.run(fitBalance, onPrediction=lambda pp: pp.sendMail(pp.getSummary()),
+                                                    waitOptimization=False)
 
     # --- Write log
-    for coinIndex in range(len(coins)):
-        pp = ppList[coinIndex]
+    for pp in ppList:
         writeBotLog(pp.getSummary())
     writeBotLog(polo.getSummary())
 
-    # --- Back test optimization
-    for coinIndex in range(len(coins)):
-        pp = ppList[coinIndex]
-        pp.backTestOptimization(pp.appreciationRate_, pp.quantizer(pp.appreciationRate_))
+    # --- Wait for the back test optimization used from tomorrow
+    pipeline.waitOptimization()
 
 
 def writeBotLog(logStr):
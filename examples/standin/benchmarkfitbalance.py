@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import time
+from predictionprice.derivedpoloniex import ExchangeTradePoloniex, MarginTradePoloniex
+from predictionprice.derivedpoloniex.standinserver import StandInPoloniexServer
+
+coins = ["ETH", "XMR", "XRP", "FCT", "DASH"]
+lastPrices = [0.02, 0.015, 0.00001, 0.003, 0.02]
+latency = 0.05  # Seconds of each response
+
+
+def setUpExchange(server):
+    for coin, lastPrice in zip(coins, lastPrices):
+        server.setOrderBook("BTC_" + coin,
+                            [[lastPrice * (1 + 0.001 * level), 10.0 / lastPrice ** 0.5] for level in range(1, 1000)],
+                            [[lastPrice * (1 - 0.001 * level), 10.0 / lastPrice ** 0.5] for level in range(1, 1000)])
+    server.setTicker("USDT_BTC", 700.0)
+    server.setBalance("BTC", 1.0, account="exchange")
+    server.setBalance(coins[0], 10.0, account="exchange")
+    server.setBalance("BTC", 1.0, account="margin")
+
+
+def report(title, server, elapsedTime):
+    print("-" * 35)
+    print(title + ": " + str(elapsedTime) + " sec")
+    for command, count in sorted(server.callCounts.items()):
+        print("    " + command + ": " + str(count))
+
+
+def main():
+    server = StandInPoloniexServer(latency=latency).start()
+    setUpExchange(server)
+    try:
+        polo = server.connect(ExchangeTradePoloniex("standin", "standin", coins=coins, buySigns=[False, True, True, False, True]))
+        startTime = time.time()
+        polo.fitBalance()
+        report("ExchangeTradePoloniex.fitBalance", server, time.time() - startTime)
+
+        server.resetCallCounts()
+        polo = server.connect(MarginTradePoloniex("standin", "standin", coins=coins, tradeSigns=["long", "short", "hold", "long", "short"]))
+        startTime = time.time()
+        polo.fitBalance()
+        report("MarginTradePoloniex.fitBalance", server, time.time() - startTime)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+import asyncio
+from predictionprice.derivedpoloniex import PooledPoloniex, AsyncPoloniex
+from predictionprice.derivedpoloniex.standinserver import StandInPoloniexServer
+from predictionprice.ratelimiter import RateLimiter
+
+coins = ["ETH", "XMR", "XRP", "FCT", "DASH", "LTC"]
+latency = 0.2  # Seconds of each response
+
+
+def setUpServer(server):
+    for coin in coins:
+        server.setOrderBook("BTC_" + coin, [[0.01 * (1 + 0.001 * level), 10.0] for level in range(1, 100)],
+                            [[0.01 * (1 - 0.001 * level), 10.0] for level in range(1, 100)])
+    server.setBalance("BTC", 1.0, account="exchange")
+
+
+async def gatherCalls(polo):
+    """Call public and private commands of every coin concurrently and return the responses."""
+    return await asyncio.gather(*([polo.returnOrderBook("BTC_" + coin, depth=5) for coin in coins]
+                                  + [polo.returnOpenOrders("BTC_" + coin) for coin in coins]))
+
+
+def main():
+    server = StandInPoloniexServer(latency=latency).start()
+    setUpServer(server)
+    errors = []
+    try:
+        client = server.connect(PooledPoloniex("standin", "standin", coach=RateLimiter(1000), poolSize=len(coins) * 2))
+        polo = AsyncPoloniex(client=client, poolSize=len(coins) * 2)
+        try:
+            startTime = time.time()
+            responses = asyncio.run(gatherCalls(polo))
+            elapsedTime = time.time() - startTime
+        finally:
+            polo.close()
+    finally:
+        server.stop()
+
+    numCalls = len(coins) * 2
+    print("AsyncPoloniex: " + str(numCalls) + " calls in " + str(elapsedTime) + " sec")
+    for command, count in sorted(server.callCounts.items()):
+        print("    " + command + ": " + str(count))
+    for response in responses:
+        if isinstance(response, dict) and "error" in response:
+            errors.append("Rejected: " + str(response))
+    if server.callCounts.get("returnOrderBook", 0) != len(coins):
+        errors.append("Not every order book was requested.")
+    # --- Sequential calls would take numCalls * latency. Private ones may be resent once for their nonce.
+    if elapsedTime > numCalls * latency / 2.0:
+        errors.append("The calls did not run concurrently.")
+    for error in errors:
+        print(error)
+    if len(errors) != 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import sys
+from predictionprice.derivedpoloniex import ExchangeTradePoloniex, MarginTradePoloniex
+from predictionprice.derivedpoloniex.standinserver import StandInPoloniexServer
+from predictionprice.ratelimiter import RateLimiter
+
+coins = ["ETH", "XMR", "LTC"]
+lastPrices = [0.05, 0.01, 0.008]
+tolerance = 0.05  # Relative difference allowed between the btc values of the coins to hold
+
+
+def setUpServer(server):
+    for coin, lastPrice in zip(coins, lastPrices):
+        server.setOrderBook("BTC_" + coin,
+                            [[lastPrice * (1 + 0.001 * level), 5.0] for level in range(1, 200)],
+                            [[lastPrice * (1 - 0.001 * level), 5.0] for level in range(1, 200)])
+    server.setTicker("USDT_BTC", 600.0)
+    server.setBalance("BTC", 1.0, account="exchange")
+    server.setBalance("XMR", 10.0, account="exchange")
+    server.setBalance("BTC", 1.0, account="margin")
+
+
+def checkExchange(server, errors):
+    """Sell the coins of sign 0 and hold the coins of sign 1 at equal btc values."""
+    buySigns = [1, 0, 1]
+    polo = server.connect(ExchangeTradePoloniex("standin", "standin", coach=RateLimiter(1000), coins=coins, buySigns=buySigns))
+    results, failures = polo.fitBalance()
+    if len(failures) != 0:
+        errors.append("ExchangeTradePoloniex.fitBalance failed: " + str(failures))
+    balances = polo.returnCompleteBalances()
+    btcValues = [float(balances.get(coin, {"btcValue": "0"})["btcValue"]) for coin in coins]
+    totalBtcValue = sum(btcValues) + float(balances["BTC"]["btcValue"])
+    for coin, buySign, btcValue in zip(coins, buySigns, btcValues):
+        if buySign == 0 and btcValue > 1e-4:
+            errors.append("Exchange holds " + coin + " of sign 0: " + str(btcValue) + " BTC")
+    heldBtcValues = [btcValue for buySign, btcValue in zip(buySigns, btcValues) if buySign == 1]
+    if max(heldBtcValues) - min(heldBtcValues) > tolerance * max(heldBtcValues):
+        errors.append("Exchange holds unequal btc values: " + str(heldBtcValues))
+    if sum(heldBtcValues) < (1.0 - tolerance) * totalBtcValue:
+        errors.append("Exchange holds " + str(sum(heldBtcValues)) + " of " + str(totalBtcValue) + " BTC")
+
+
+def checkMargin(server, errors):
+    """Take the positions of tradeSigns and no position of hold."""
+    tradeSigns = ["long", "short", "hold"]
+    polo = server.connect(MarginTradePoloniex("standin", "standin", coach=RateLimiter(1000), coins=coins, tradeSigns=tradeSigns))
+    results, failures = polo.fitBalance()
+    if len(failures) != 0:
+        errors.append("MarginTradePoloniex.fitBalance failed: " + str(failures))
+    positions = polo.getMarginPosition()
+    for coin, tradeSign in zip(coins, tradeSigns):
+        positionType = positions["BTC_" + coin]["type"]
+        if positionType != (tradeSign if tradeSign != "hold" else "none"):
+            errors.append("Margin position of " + coin + " is " + positionType + " for " + tradeSign)
+
+
+def main():
+    server = StandInPoloniexServer(latency=0.01).start()
+    setUpServer(server)
+    errors = []
+    try:
+        checkExchange(server, errors)
+        checkMargin(server, errors)
+    finally:
+        server.stop()
+    for error in errors:
+        print(error)
+    print("Errors: " + str(len(errors)))
+    if len(errors) != 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
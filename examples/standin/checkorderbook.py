@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import sys
+import random
+import numpy as np
+from predictionprice.derivedpoloniex.orderbook import OrderBook
+
+numBooks = 3000
+maxLevels = 300
+
+
+def floatToEighthDigit(numFloat):
+    """Same as MarginTradePoloniex.floatToEighthDigit."""
+    return "{0:.9f}".format(float(numFloat)).split(".")[0] + "." + "{0:.9f}".format(float(numFloat)).split(".")[1][0:8]
+
+
+def loopRateAndAmount(levels, btcValue):
+    """The loop OrderBook.rateAndAmount replaced: walk the levels until btcValue is covered."""
+    sumBtcValue = 0.0
+    sumAmount = 0.0
+    for rate, amount in levels:
+        sumAmount += float(amount)
+        sumBtcValue += float(rate) * float(amount)
+        if float(btcValue) < sumBtcValue:
+            break
+    return rate, sumAmount, sumBtcValue
+
+
+def loopExchange(levels, btcValue):
+    """Rate and amount as ExchangeTradePoloniex computed them with the loop."""
+    rate, sumAmount, sumBtcValue = loopRateAndAmount(levels, btcValue)
+    return rate, np.floor((sumAmount - (float(sumBtcValue) - float(btcValue)) / float(rate)) * 1e7) * 1e-7
+
+
+def loopMargin(levels, btcValue):
+    """Rate and amount as MarginTradePoloniex computed them with the loop."""
+    rate, sumAmount, sumBtcValue = loopRateAndAmount(levels, btcValue)
+    rate = floatToEighthDigit(rate)
+    return rate, floatToEighthDigit(sumAmount - (float(sumBtcValue) - float(btcValue)) / float(rate))
+
+
+def loopRateAndBtcValue(levels, coinAmount):
+    """The same loop walking the levels until coinAmount is covered."""
+    sumBtcValue = 0.0
+    sumAmount = 0.0
+    for rate, amount in levels:
+        sumAmount += float(amount)
+        sumBtcValue += float(rate) * float(amount)
+        if float(coinAmount) < sumAmount:
+            break
+    return rate, sumBtcValue - (sumAmount - float(coinAmount)) * float(rate)
+
+
+def randomBook(generator):
+    """Return random levels and random targets up to 1.2 times the depth of the book."""
+    levels = [["%.8f" % generator.uniform(1e-6, 0.1), generator.uniform(0.01, 1000.0)]
+              for _ in range(generator.randint(1, maxLevels))]
+    totalBtcValue = sum([float(rate) * amount for rate, amount in levels])
+    totalAmount = sum([amount for rate, amount in levels])
+    btcValue = generator.choice([generator.uniform(0.0, totalBtcValue * 1.2), "%.8f" % generator.uniform(0.0, totalBtcValue)])
+    coinAmount = generator.choice([generator.uniform(0.0, totalAmount * 1.2), "%.8f" % generator.uniform(0.0, totalAmount)])
+    return levels, btcValue, coinAmount
+
+
+def main():
+    generator = random.Random(0)
+    mismatches = {"exchange": 0, "margin": 0, "rateAndBtcValue": 0}
+    for _ in range(numBooks):
+        levels, btcValue, coinAmount = randomBook(generator)
+        book = OrderBook(levels)
+
+        rate, amount = book.rateAndAmount(btcValue)
+        if (rate, np.floor(amount * 1e7) * 1e-7) != loopExchange(levels, btcValue):
+            mismatches["exchange"] += 1
+        rate, amount = book.rateAndAmount(btcValue, floatToEighthDigit)
+        if (rate, floatToEighthDigit(amount)) != loopMargin(levels, btcValue):
+            mismatches["margin"] += 1
+        rate, btcValueOfAmount = book.rateAndBtcValue(coinAmount)
+        loopRate, loopBtcValue = loopRateAndBtcValue(levels, coinAmount)
+        if rate != loopRate or abs(btcValueOfAmount - loopBtcValue) > 1e-9 * max(abs(loopBtcValue), 1.0):
+            mismatches["rateAndBtcValue"] += 1
+
+    print("Books: " + str(numBooks))
+    for name, count in sorted(mismatches.items()):
+        print("    " + name + " mismatches: " + str(count))
+    if sum(mismatches.values()) != 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
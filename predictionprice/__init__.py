@@ -1,2 +1,3 @@
 __version__ = "2.0.1"
-from .predictionprice import PredictionPrice
\ No newline at end of file
+from .predictionprice import PredictionPrice
+from .pipeline import BotPipeline
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2016 Tylor Darden
+Released under the MIT license
+http://opensource.org/licenses/mit-license.php
+"""
+from contextlib import closing
+import pandas as pd
+from .sqlitefile import SqliteFile
+
+
+class CandleStore(SqliteFile):
+    columns = ["date", "high", "low", "open", "close", "volume", "quoteVolume", "weightedAverage"]
+
+    def __init__(self, filePath):
+        """Persistent store of the candles of every currency pair and period in a SQLite file."""
+        super(CandleStore, self).__init__(filePath)
+        with closing(self.connect()) as connection, connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS candles (pair TEXT NOT NULL, period INTEGER NOT NULL, "
+                               + ", ".join([column + " REAL" for column in self.columns])
+                               + ", PRIMARY KEY (pair, period, date))")
+
+    def latestTimestamp(self, pair, period):
+        """Return the timestamp of the latest stored candle or None if nothing is stored."""
+        with closing(self.connect()) as connection:
+            row = connection.execute("SELECT MAX(date) FROM candles WHERE pair = ? AND period = ?", (pair, period)).fetchone()
+        return None if row[0] is None else int(row[0])
+
+    def saveCandles(self, pair, period, candles):
+        """Insert or overwrite candles returned by returnChartData. The latest candle is overwritten while it grows."""
+        rows = [[pair, period] + [float(candle[column]) for column in self.columns]
+                for candle in candles if float(candle["date"]) > 0]  # Poloniex returns date 0 when there is no candle
+        with closing(self.connect()) as connection, connection:
+            connection.executemany("INSERT OR REPLACE INTO candles (pair, period, " + ", ".join(self.columns) + ") VALUES ("
+                                   + ", ".join(["?"] * (len(self.columns) + 2)) + ")", rows)
+        return len(rows)
+
+    def loadCandles(self, pair, period, start, end):
+        """Return candles from start to end as pandas.DataFrame in ascending order of date."""
+        with closing(self.connect()) as connection:
+            rows = connection.execute("SELECT " + ", ".join(self.columns) + " FROM candles "
+                                      "WHERE pair = ? AND period = ? AND date >= ? AND date <= ? ORDER BY date",
+                                      (pair, period, start, end)).fetchall()
+        return pd.DataFrame(rows, columns=self.columns).astype(float)
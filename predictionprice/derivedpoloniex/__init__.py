@@ -1,3 +1,7 @@
 
+import sys
+from .pooledpoloniex import PooledPoloniex
 from .exchangetrade import ExchangeTradePoloniex
-from .margintrade import MarginTradePoloniex
\ No newline at end of file
+from .margintrade import MarginTradePoloniex
+if sys.version_info >= (3, 7):
+    from .asyncpoloniex import AsyncPoloniex
\ No newline at end of file
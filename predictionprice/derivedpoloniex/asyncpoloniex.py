@@ -0,0 +1,170 @@
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from .pooledpoloniex import PooledPoloniex, isNonceError
+
+
+class AsyncPoloniex(object):
+    def __init__(self, Key=False, Secret=False, timeout=10, coach=True, poolSize=10, maxRetries=3,
+                 publicUrl=None, tradingUrl=None, client=None):
+        """asyncio client with the command surface of poloniex.Poloniex. Every method is a coroutine.
+        This is an executor wrapper, not non-blocking I/O: requests are signed, sent and cached by the blocking
+        requests session of a PooledPoloniex (client, or a new one from the other arguments) on a thread pool
+        of poolSize, so at most poolSize requests are in flight. Only the waits of its rate limiter are asyncio sleeps.
+        Every command runs concurrently. The nonce is taken and signed under the lock of the client and the request
+        is sent outside it, so a private command reaching Poloniex after a greater nonce is signed again and resent
+        up to maxRetries times of the client like PooledPoloniex.sendCommand."""
+        self.ownClient = client is None
+        if client is None:
+            client = PooledPoloniex(Key, Secret, timeout, coach, logging.WARNING, False, poolSize, maxRetries)
+        if publicUrl is not None:
+            client.publicUrl = publicUrl
+        if tradingUrl is not None:
+            client.tradingUrl = tradingUrl
+        self.client = client
+        self.executor = ThreadPoolExecutor(max_workers=poolSize)
+        self.DAY = 60 * 60 * 24
+        self.HOUR = 60 * 60
+        # --- Extended names used by the trading classes
+        self.marketTicker = self.returnTicker
+        self.marketOrders = self.returnOrderBook
+        self.marketChart = self.returnChartData
+        self.myCompleteBalances = self.returnCompleteBalances
+        self.myOrders = self.returnOpenOrders
+        self.myMarginPosition = self.getMarginPosition
+
+    async def waitRateLimiter(self, commandClass):
+        """Wait until a call of commandClass is within the rate limit without blocking the event loop."""
+        if self.client.rateLimiter is not None:
+            waitTime = self.client.rateLimiter.reserve(commandClass)
+            if waitTime > 0:
+                await asyncio.sleep(waitTime)
+
+    async def sendRequest(self, method, url, data, headers):
+        """Send a prepared request by the blocking session of the client on the thread pool and return decoded json."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.client.sendRequest, method, url, data, headers)
+
+    async def sendCommand(self, command, args={}):
+        """Send command with args to Poloniex and return decoded json."""
+        commandClass = self.client.commandClass(command)
+        # --- Wait before making the nonce so that a waiting call does not send an older nonce after a newer one.
+        await self.waitRateLimiter(commandClass)
+        response = await self.sendRequest(*self.client.prepareRequest(command, args))
+        for retry in range(self.client.maxRetries):
+            if not isNonceError(response):
+                break
+            await self.waitRateLimiter(commandClass)
+            response = await self.sendRequest(*self.client.prepareRequest(command, args))
+        return response
+
+    async def __call__(self, command, args={}):
+        """Return the cached response of command with args or send it to Poloniex and return decoded json.
+        The response cache of the client is shared with its synchronous calls and dropped after trading commands."""
+        cached, value = self.client.readCache(command, args)
+        if cached:
+            return value
+        response = None
+        try:
+            response = await self.sendCommand(command, args)
+            return response
+        finally:
+            self.client.writeCache(command, args, response, value)
+
+    def close(self):
+        """Shut down the thread pool and the session unless the client was given."""
+        self.executor.shutdown(wait=True)
+        if self.ownClient:
+            self.client.session.close()
+
+    # --- Public commands
+    async def returnTicker(self):
+        return await self("returnTicker")
+
+    async def return24hVolume(self):
+        return await self("return24hVolume")
+
+    async def returnCurrencies(self):
+        return await self("returnCurrencies")
+
+    async def returnOrderBook(self, pair="all", depth=20):
+        return await self("returnOrderBook", {"currencyPair": str(pair).upper(), "depth": str(depth)})
+
+    async def returnChartData(self, pair, period=False, start=False, end=False):
+        if not end:
+            end = time.time()
+        if not period:
+            period = self.DAY
+        if not start:
+            start = end - self.DAY * 60
+        return await self("returnChartData", {"currencyPair": str(pair).upper(), "period": str(period),
+                                              "start": str(start), "end": str(end)})
+
+    async def marketTradeHist(self, pair, start=False, end=False):
+        if not end:
+            end = time.time()
+        if not start:
+            start = end - self.HOUR
+        args = {"command": "returnTradeHistory", "currencyPair": str(pair).upper(), "start": str(start), "end": str(end)}
+        await self.waitRateLimiter("public")
+        return await self.sendRequest("GET", self.client.publicUrl + "?" + urlencode(args), None, {})
+
+    # --- Private commands
+    async def returnBalances(self):
+        return await self("returnBalances")
+
+    async def returnCompleteBalances(self, account="all"):
+        return await self("returnCompleteBalances", {"account": str(account)})
+
+    async def returnAvailableAccountBalances(self):
+        return await self("returnAvailableAccountBalances")
+
+    async def returnTradableBalances(self):
+        return await self("returnTradableBalances")
+
+    async def returnOpenOrders(self, pair="all"):
+        return await self("returnOpenOrders", {"currencyPair": str(pair).upper()})
+
+    async def returnTradeHistory(self, pair):
+        return await self("returnTradeHistory", {"currencyPair": str(pair).upper()})
+
+    async def returnOrderTrades(self, orderId):
+        return await self("returnOrderTrades", {"orderNumber": str(orderId)})
+
+    async def returnFeeInfo(self):
+        return await self("returnFeeInfo")
+
+    async def returnMarginAccountSummary(self):
+        return await self("returnMarginAccountSummary")
+
+    async def getMarginPosition(self, pair="all"):
+        return await self("getMarginPosition", {"currencyPair": str(pair).upper()})
+
+    async def buy(self, pair, rate, amount):
+        return await self("buy", {"currencyPair": str(pair).upper(), "rate": str(rate), "amount": str(amount)})
+
+    async def sell(self, pair, rate, amount):
+        return await self("sell", {"currencyPair": str(pair).upper(), "rate": str(rate), "amount": str(amount)})
+
+    async def cancelOrder(self, orderId):
+        return await self("cancelOrder", {"orderNumber": str(orderId)})
+
+    async def moveOrder(self, orderId, rate, amount):
+        return await self("moveOrder", {"orderNumber": str(orderId), "rate": str(rate), "amount": str(amount)})
+
+    async def marginBuy(self, pair, rate, amount, lendingRate=2):
+        return await self("marginBuy", {"currencyPair": str(pair).upper(), "rate": str(rate), "amount": str(amount),
+                                        "lendingRate": str(lendingRate)})
+
+    async def marginSell(self, pair, rate, amount, lendingRate=2):
+        return await self("marginSell", {"currencyPair": str(pair).upper(), "rate": str(rate), "amount": str(amount),
+                                         "lendingRate": str(lendingRate)})
+
+    async def closeMarginPosition(self, pair):
+        return await self("closeMarginPosition", {"currencyPair": str(pair).upper()})
+
+    async def transferBalance(self, coin, amount, fromAccount, toAccount):
+        return await self("transferBalance", {"currency": str(coin).upper(), "amount": str(amount),
+                                              "fromAccount": str(fromAccount), "toAccount": str(toAccount)})
@@ -0,0 +1,66 @@
+import threading
+import traceback
+from multiprocessing.pool import ThreadPool
+
+
+class BtcBudget(object):
+    def __init__(self, btcValue):
+        """BTC that concurrent orders may spend in total."""
+        self.remaining = float(btcValue)
+        self.lock = threading.Lock()
+
+    def reserve(self, btcValue):
+        """Take up to btcValue from the budget and return the amount taken."""
+        with self.lock:
+            reserved = max(min(float(btcValue), self.remaining), 0.0)
+            self.remaining -= reserved
+            return reserved
+
+
+def failureReason(response):
+    """Return the error of a Poloniex response (or of a list of them) or None if it succeeded."""
+    if isinstance(response, dict) and "error" in response:
+        return str(response["error"])
+    if isinstance(response, list):
+        for element in response:
+            reason = failureReason(element)
+            if reason is not None:
+                return reason
+    return None
+
+
+class CoinExecutor(object):
+    def __init__(self, workers=6):
+        """Run the orders of many coins concurrently on workers threads.
+        The pace of the requests is kept by the rate limiter of the client that places the orders."""
+        self.workers = workers
+
+    def run(self, tasks, budget=None):
+        """Run tasks given as (coin, function, btcValue) by calling function(coin, btcValue), or function(coin) if btcValue is None.
+        With budget, btcValue of each task is reserved from it in the order of tasks before any of them starts.
+        Return {coin: response} and {coin: reason} of the tasks that raised or returned an error."""
+        if budget is not None:
+            tasks = [(coin, function, btcValue if btcValue is None else budget.reserve(btcValue)) for coin, function, btcValue in tasks]
+        results, failures = {}, {}
+        if len(tasks) == 0:
+            return results, failures
+
+        def runTask(task):
+            coin, function, btcValue = task
+            try:
+                return coin, (function(coin) if btcValue is None else function(coin, btcValue)), None
+            except Exception:
+                return coin, None, traceback.format_exc()
+
+        pool = ThreadPool(min(self.workers, len(tasks)))
+        try:
+            outcomes = pool.map(runTask, tasks)
+        finally:
+            pool.close()
+            pool.join()
+        for coin, response, error in outcomes:
+            results[coin] = response
+            reason = error if error is not None else failureReason(response)
+            if reason is not None:
+                failures[coin] = reason
+        return results, failures
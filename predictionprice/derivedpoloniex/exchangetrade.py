@@ -8,14 +8,20 @@ import datetime
 import logging
 import numpy as np
 import pandas as pd
-import poloniex
+from .pooledpoloniex import PooledPoloniex
+from .orderbook import OrderBookFetcher
+from .coinexecutor import BtcBudget, CoinExecutor
+from .responsecache import DEFAULT_CACHE_TTLS
 
 
-class ExchangeTradePoloniex(poloniex.Poloniex):
+class ExchangeTradePoloniex(PooledPoloniex):
+    minimumTotal = 0.0001  # BTC, the smallest order Poloniex accepts
+
     def __init__(self, APIKey=False, Secret=False,timeout=10, coach=True, loglevel=logging.WARNING, extend=True, basicCoin="BTC",
                  workingDirPath=".", gmailAddress="", gmailAddressPassword="",
-                 coins=[], buySigns=[] ):
-        super(ExchangeTradePoloniex, self).__init__(APIKey, Secret, timeout, coach, loglevel, extend)
+                 coins=[], buySigns=[], poolSize=10, maxRetries=3, cacheTtls=DEFAULT_CACHE_TTLS):
+        super(ExchangeTradePoloniex, self).__init__(APIKey, Secret, timeout, coach, loglevel, extend, poolSize, maxRetries,
+                                                    cacheTtls=cacheTtls)
         self.basicCoin = basicCoin
         self.workingDirPath = workingDirPath
         self.gmailAddress = gmailAddress
@@ -23,6 +29,8 @@ class ExchangeTradePoloniex(poloniex.Poloniex):
         self.coins = coins
         self.buySigns = buySigns
         self.todayStr = str(datetime.datetime.now(pytz.timezone("UTC")))[0:10]
+        self.orderBookFetcher = OrderBookFetcher(self)
+        self.coinExecutor = CoinExecutor(poolSize)
 
     def myAvailableCompleteBalances(self):
         """Return AvailableCompleteBalances as pandas.DataFrame."""
@@ -38,20 +46,8 @@ class ExchangeTradePoloniex(poloniex.Poloniex):
         return estimatedValueOfHoldingsAsBTC, estimatedValueOfHoldingsAsUSD
 
     def cancelOnOrder(self,coin):
-        """Cancel on Exchange Order"""
-        onOrders = pd.DataFrame.from_dict(self.myOrders(pair=self.basicCoin + "_" + coin))
-        if len(onOrders) == 0: return
-        onExchangeOrders = onOrders.loc[np.where(onOrders["margin"]==0)]
-        if len(onExchangeOrders) == 0: return
-    
-        while len(onExchangeOrders) != 0:
-            orderId = onExchangeOrders["orderNumber"].tolist()[0]
-            self.cancelOrder(orderId)
-            onOrders = pd.DataFrame.from_dict(self.myOrders(pair=self.basicCoin + "_" + coin))
-            if len(onOrders) == 0: 
-                return
-            else:
-                onExchangeOrders = onOrders.loc[np.where(onOrders["margin"]==0)]
+        """Cancel on Exchange Order and return {orderNumber: reason} of orders that could not be canceled."""
+        return self.cancelOpenOrders(self.basicCoin + "_" + coin, margin=0)
 
     def marketSell(self, coin, btcValue):
         """Sell coin with market price as estimated btcValue."""
@@ -60,28 +56,15 @@ class ExchangeTradePoloniex(poloniex.Poloniex):
         if len(np.where(balance.index==coin)[0])==0: return
         if float(btcValue)>float(balance.loc[coin]["btcValue"]):
             return self.marketSellAll(coin)
-        bids = pd.Series(pd.DataFrame.from_dict(self.marketOrders(pair=self.basicCoin + "_" + coin, depth=1000)["bids"]).values.tolist())
-        sumBtcValue = 0.0
-        sumAmount = 0.0
-        for rate, amount in zip(np.array(bids.tolist())[:,0],np.array(bids.tolist())[:,1]):
-            sumAmount += float(amount)
-            sumBtcValue += float(rate)*float(amount)
-            if float(btcValue) < sumBtcValue:
-                break
-        coinAmount = np.floor((sumAmount - (float(sumBtcValue) - float(btcValue))/float(rate)) * 1e7) * 1e-7
-        return self.sell(self.basicCoin + "_" + coin, rate, coinAmount)
+        return self.placeSell(coin, btcValue)
 
     def marketSellAll(self, coin):
         """Sell all coin with market price."""
         self.cancelOnOrder(coin)
         balance = self.myAvailableCompleteBalances()
         if len(np.where(balance.index==coin)[0])==0: return
-        bids = pd.Series(pd.DataFrame.from_dict(self.marketOrders(pair=self.basicCoin + "_" + coin, depth=1000)["bids"]).values.tolist())
-        sumBtcValue = 0.0
-        for rate, amount in zip(np.array(bids.tolist())[:,0],np.array(bids.tolist())[:,1]):
-            sumBtcValue += float(rate)*float(amount)
-            if float(balance.loc[coin]["btcValue"]) < sumBtcValue:
-                break
+        btcValue = balance.loc[coin]["btcValue"]
+        rate = self.orderBookFetcher.load(self.basicCoin + "_" + coin, "bids", btcValue=btcValue).rateAndAmount(btcValue)[0]
         return self.sell(self.basicCoin + "_" + coin, rate, balance.loc[coin]["available"])
 
     def marketBuy(self, coin, btcValue):
@@ -91,80 +74,102 @@ class ExchangeTradePoloniex(poloniex.Poloniex):
         if len(np.where(balance.index==self.basicCoin)[0])==0: return
         if float(btcValue)>float(balance.loc[self.basicCoin]["btcValue"]):
             return self.marketBuyAll(coin)
-        asks = pd.Series(pd.DataFrame.from_dict(self.marketOrders(pair=self.basicCoin + "_" + coin, depth=1000)["asks"]).values.tolist())
-        sumBtcValue = 0.0
-        sumAmount = 0.0
-        for rate, amount in zip(np.array(asks.tolist())[:,0],np.array(asks.tolist())[:,1]):
-            sumAmount += float(amount)
-            sumBtcValue += float(rate)*float(amount)
-            if float(btcValue) < sumBtcValue:
-                break
-        coinAmount = np.floor((sumAmount - (float(sumBtcValue) - float(btcValue)) / float(rate)) * 1e7) * 1e-7
-        return self.buy(self.basicCoin + "_" + coin, rate, coinAmount)
+        return self.placeBuy(coin, btcValue)
 
     def marketBuyAll(self, coin):
         """Buy coin with market price as much as possible."""
         self.cancelOnOrder(coin)
         balance = self.myAvailableCompleteBalances()
         if len(np.where(balance.index == self.basicCoin)[0]) == 0: return
-        asks = pd.Series(pd.DataFrame.from_dict(self.marketOrders(pair=self.basicCoin + "_" + coin, depth=1000)["asks"]).values.tolist())
-        sumBtcValue = 0.0
-        sumAmount = 0.0
-        for rate, amount in zip(np.array(asks.tolist())[:, 0], np.array(asks.tolist())[:, 1]):
-            sumAmount += float(amount)
-            sumBtcValue += float(rate) * float(amount)
-            if float(balance.loc[self.basicCoin]["btcValue"]) < sumBtcValue:
-                break
-        coinAmount = np.floor((
-                              sumAmount - (float(sumBtcValue) - float(balance.loc[self.basicCoin]["btcValue"])) / float(
-                                  rate)) * 1e7) * 1e-7
-        if float(rate) * coinAmount < 0.0001:
+        return self.placeBuy(coin, balance.loc[self.basicCoin]["btcValue"])
+
+    def placeSell(self, coin, btcValue):
+        """Sell coin as estimated btcValue with market price without checking balances."""
+        rate, amount = self.orderBookFetcher.load(self.basicCoin + "_" + coin, "bids", btcValue=btcValue).rateAndAmount(btcValue)
+        coinAmount = np.floor(amount * 1e7) * 1e-7
+        return self.sell(self.basicCoin + "_" + coin, rate, coinAmount)
+
+    def placeBuy(self, coin, btcValue):
+        """Buy coin as estimated btcValue with market price without checking balances.
+        The order locks rate * amount at its limit rate, so the amount is capped to keep that within btcValue."""
+        rate, amount = self.orderBookFetcher.load(self.basicCoin + "_" + coin, "asks", btcValue=btcValue).rateAndAmount(btcValue)
+        coinAmount = np.floor(min(amount, float(btcValue) / float(rate)) * 1e7) * 1e-7
+        if float(rate) * coinAmount < self.minimumTotal:
             return
         return self.buy(self.basicCoin + "_" + coin, rate, coinAmount)
-    
+
+    def cancelAndPlaceBuy(self, coin, btcValue):
+        """Cancel on Exchange Order and buy coin as estimated btcValue reserved from the budget of fitBuy.
+        Return an error instead of placing nothing when the reservation or the capped order is below the minimum total."""
+        if float(btcValue) < self.minimumTotal:
+            return {"error": "Budget exhausted: " + "{0:.8f}".format(float(btcValue)) + " BTC reserved, "
+                             + "below the minimum total of " + str(self.minimumTotal) + " BTC."}
+        self.cancelOnOrder(coin)
+        response = self.placeBuy(coin, btcValue)
+        if response is None:
+            return {"error": "Below the minimum total of " + str(self.minimumTotal) + " BTC after capping the amount at the limit rate."}
+        return response
+
     def fitSell(self):
-        """Sell coins in accordance with buySigns."""
+        """Sell coins in accordance with buySigns concurrently and return results and failures of each coin."""
         balance = self.myAvailableCompleteBalances()
+        tasks = []
         for coinIndex in range(len(self.coins)):
             if not self.buySigns[coinIndex]: #Sign is Sell?
                 if len(np.where(balance.index == self.coins[coinIndex])[0]) != 0:  # Holding the coin?
-                    self.marketSellAll(self.coins[coinIndex])
+                    tasks.append((self.coins[coinIndex], self.marketSellAll, None))
+        return self.coinExecutor.run(tasks)
 
     def fitBuy(self):
-        """Buy coins in accordance with buySigns."""
+        """Buy coins in accordance with buySigns concurrently and return results and failures of each coin.
+        The buys together spend at most the BTC left after selling extra coins, reserved in the order of coins, so the budget
+        takes the place of the fallback of marketBuy to marketBuyAll. Coins left without enough budget are reported in failures.
+        Coins held within the minimum total of their distribution are not bought."""
         balance = self.myAvailableCompleteBalances()
         if np.sum(self.buySigns)==0: # All signs are sell?
-            return
+            return {}, {}
         else:
             myBTC,myUSD = self.myEstimatedValueOfHoldings()
             distributionBTCValue = myBTC*1.0/np.sum(self.buySigns)
             # --- Sell extra coins
-            numSelledExtraCoins = 0
+            tasks = []
             for coinIndex in range(len(self.coins)):
                 if self.buySigns[coinIndex]: #Sign is Buy?
                     if len(np.where(balance.index == self.coins[coinIndex])[0]) != 0:  # Holding the coin?
                         extraBTCValue = float(balance.loc[self.coins[coinIndex]]["btcValue"]) - float(distributionBTCValue)
                         if extraBTCValue>0:
-                            self.marketSell(self.coins[coinIndex],extraBTCValue)
-                            numSelledExtraCoins += 1
+                            tasks.append((self.coins[coinIndex], self.marketSell, extraBTCValue))
+            results, failures = self.coinExecutor.run(tasks)
 
             # --- Buy coins by distlibuted btcValue
             balance = self.myAvailableCompleteBalances()
             myBTC,myUSD = self.myEstimatedValueOfHoldings()
             distributionBTCValue = myBTC*1.0/np.sum(self.buySigns)
+            tasks = []
             for coinIndex in range(len(self.coins)):
                 if self.buySigns[coinIndex]:  # Sign is Buy?
                     if len(np.where(balance.index == self.coins[coinIndex])[0]) != 0:  # Holding the coin?
                         extraBTCValue = float(balance.loc[self.coins[coinIndex]]["btcValue"]) - float(distributionBTCValue)
-                        if extraBTCValue < 0:
-                            self.marketBuy(self.coins[coinIndex], np.abs(extraBTCValue))
+                        if extraBTCValue <= -self.minimumTotal:
+                            tasks.append((self.coins[coinIndex], self.cancelAndPlaceBuy, np.abs(extraBTCValue)))
                     else:
-                        self.marketBuy(self.coins[coinIndex], distributionBTCValue)
+                        tasks.append((self.coins[coinIndex], self.cancelAndPlaceBuy, distributionBTCValue))
+            if len(np.where(balance.index == self.basicCoin)[0]) == 0:
+                budget = BtcBudget(0.0)
+            else:
+                budget = BtcBudget(balance.loc[self.basicCoin]["available"])
+            buyResults, buyFailures = self.coinExecutor.run(tasks, budget)
+            results.update(buyResults)
+            failures.update(buyFailures)
+            return results, failures
 
     def fitBalance(self):
-        """Call fitSell and fitBuy."""
-        self.fitSell()
-        self.fitBuy()
+        """Call fitSell and fitBuy and return results and failures of each coin."""
+        results, failures = self.fitSell()
+        buyResults, buyFailures = self.fitBuy()
+        results.update(buyResults)
+        failures.update(buyFailures)
+        return results, failures
 
     def getSummary(self):
         myBTC, myUSD = self.myEstimatedValueOfHoldings()
@@ -3,19 +3,23 @@ import smtplib
 import email
 import csv
 import pytz
-import time
 import datetime
 import logging
 import numpy as np
 import pandas as pd
-import poloniex
+from .pooledpoloniex import PooledPoloniex
+from .orderbook import OrderBookFetcher
+from .coinexecutor import CoinExecutor
+from .retrypolicy import RetryPolicy
+from .responsecache import DEFAULT_CACHE_TTLS
 
 
-class MarginTradePoloniex(poloniex.Poloniex):
+class MarginTradePoloniex(PooledPoloniex):
     def __init__(self, Key=False, Secret=False,timeout=10, coach=True, loglevel=logging.WARNING, extend=True, basicCoin="BTC",
                  workingDirPath=".", gmailAddress="", gmailAddressPassword="",
-                 coins=[], tradeSigns=[] ):
-        super(MarginTradePoloniex, self).__init__(Key, Secret, timeout, coach, loglevel, extend)
+                 coins=[], tradeSigns=[], poolSize=10, maxRetries=3, cacheTtls=DEFAULT_CACHE_TTLS, retryPolicy=None):
+        super(MarginTradePoloniex, self).__init__(Key, Secret, timeout, coach, loglevel, extend, poolSize, maxRetries,
+                                                  cacheTtls=cacheTtls)
         self.basicCoin = basicCoin
         self.workingDirPath = workingDirPath
         self.gmailAddress = gmailAddress
@@ -23,6 +27,9 @@ class MarginTradePoloniex(poloniex.Poloniex):
         self.coins = coins
         self.tradeSigns = tradeSigns
         self.todayStr = str(datetime.datetime.now(pytz.timezone("UTC")))[0:10]
+        self.orderBookFetcher = OrderBookFetcher(self)
+        self.coinExecutor = CoinExecutor(poolSize)
+        self.retryPolicy = RetryPolicy() if retryPolicy is None else retryPolicy
         self.leverage = 2.5
 
 
@@ -48,36 +55,26 @@ class MarginTradePoloniex(poloniex.Poloniex):
             return position.iloc[np.where(position["amount"] != "0.00000000")]
 
     def cancelOnMarginOrder(self, coin):
-        """Cancel on Margin Order"""
-        onOrders = pd.DataFrame.from_dict(self.returnOpenOrders(pair=self.basicCoin + "_" + coin))
-        if len(onOrders) == 0:
-            return
-        onMarginOrders = onOrders.loc[np.where(onOrders["margin"] == 1)]
-        if len(onMarginOrders) == 0:
-            return
-        while len(onMarginOrders) != 0:
-            orderId = onMarginOrders["orderNumber"].tolist()[0]
-            self.cancelOrder(orderId)
-            onOrders = pd.DataFrame.from_dict(self.returnOpenOrders(pair=self.basicCoin + "_" + coin))
-            if len(onOrders) == 0:
-                return
-            else:
-                onMarginOrders = onOrders.loc[np.where(onOrders["margin"] == 1)]
+        """Cancel on Margin Order and return {orderNumber: reason} of orders that could not be canceled."""
+        return self.cancelOpenOrders(self.basicCoin + "_" + coin, margin=1)
 
     def returnRateAndAmount(self, orderStr, coin, btcValue):
         """Return BTC rate and coin amount to trade some coin."""
-        order = pd.Series(pd.DataFrame.from_dict(
-            self.marketOrders(pair=self.basicCoin + "_" + coin, depth=1000)[orderStr]).values.tolist())
-        sumBtcValue = 0.0
-        sumAmount = 0.0
-        for rate, amount in zip(np.array(order.tolist())[:, 0], np.array(order.tolist())[:, 1]):
-            sumAmount += float(amount)
-            sumBtcValue += float(rate) * float(amount)
-            if float(btcValue) < sumBtcValue:
-                break
-        rate = self.floatToEighthDigit(rate)
-        coinAmount = self.floatToEighthDigit(sumAmount - (float(sumBtcValue) - float(btcValue)) / float(rate))
-        return rate, coinAmount
+        book = self.orderBookFetcher.load(self.basicCoin + "_" + coin, orderStr, btcValue=btcValue)
+        rate, amount = book.rateAndAmount(btcValue, self.floatToEighthDigit)
+        return rate, self.floatToEighthDigit(amount)
+
+    def marginOrder(self, orderStr, coin, btcValue):
+        """Place margin order of btcValue at market price on orderStr("asks" to buy, "bids" to sell) side.
+        Rejected orders are retried by retryPolicy and the response has its "retryReport"."""
+        order = self.marginBuy if orderStr == "asks" else self.marginSell
+
+        def placeOrder(btcValue):
+            rate, coinAmount = self.returnRateAndAmount(orderStr, coin, self.floatToEighthDigit(btcValue))
+            if float(rate) * float(coinAmount) < 0.0001:
+                return
+            return order(self.basicCoin + "_" + coin, rate, coinAmount, lendingRate=0.02)
+        return self.retryPolicy.run(placeOrder, btcValue, self.returnTradableBalance)
 
     def marketMarginBuy(self, coin, btcValue):
         """Buy coin with market price as much as possible."""
@@ -86,65 +83,88 @@ class MarginTradePoloniex(poloniex.Poloniex):
         tradableBalance = self.returnTradableBalance()
         if float(btcValue) > float(tradableBalance):
             btcValue = tradableBalance
-        rate, coinAmount = self.returnRateAndAmount("asks", coin, btcValue)
-        if float(rate) * float(coinAmount) < 0.0001:
-            return
-        ret = self.marginBuy(self.basicCoin + "_" + coin, rate, coinAmount, lendingRate=0.02)
-        while ret["success"] == 0:
-            rate, coinAmount = self.returnRateAndAmount("asks", coin, btcValue)
-            ret = self.marginBuy(self.basicCoin + "_" + coin, rate, coinAmount, lendingRate=0.02)
-            time.sleep(1)
-            btcValue = self.floatToEighthDigit(0.999 * float(btcValue))
-        return ret
+        return self.marginOrder("asks", coin, btcValue)
 
     def marketMarginSell(self, coin, btcValue):
-        """Buy coin with market price as much as possible."""
+        """Sell coin with market price as much as possible."""
         self.cancelOnMarginOrder(coin)
         btcValue = self.floatToEighthDigit(btcValue)
         tradableBalance = self.returnTradableBalance()
         if float(btcValue) > float(tradableBalance):
             btcValue = tradableBalance
-        rate, coinAmount = self.returnRateAndAmount("bids", coin, btcValue)
-        if float(rate) * float(coinAmount) < 0.0001:
-            return
-        ret = self.marginSell(self.basicCoin + "_" + coin, rate, coinAmount, lendingRate=0.02)
-        while ret["success"] == 0:
-            rate, coinAmount = self.returnRateAndAmount("bids", coin, btcValue)
-            ret = self.marginSell(self.basicCoin + "_" + coin, rate, coinAmount, lendingRate=0.02)
-            time.sleep(1)
-            btcValue = self.floatToEighthDigit(0.999 * float(btcValue))
-        return ret
+        return self.marginOrder("bids", coin, btcValue)
 
     def distributedBtcValue(self):
         """Return BTC value that is whole you can trade divide tby the number of coin you want to trade."""
         summary = self.returnSummary()
         return self.floatToEighthDigit(float(summary.loc["netValue"]) * self.leverage / len(self.coins))
 
+    def takeMarginSnapshot(self):
+        """Return margin account summary, positions and open orders of all pairs."""
+        return {"summary": self.returnMarginAccountSummary(),
+                "positions": self.getMarginPosition(pair="all"),
+                "openOrders": self.returnOpenOrders(pair="all")}
+
+    def planFitBalance(self, snapshot):
+        """Return actions re-taking your positions based on the trading sign from one snapshot.
+        Every action is a dict of "action"("cancel", "close", "long" or "short"), "coin" and "pair"
+        with "orderNumbers" to cancel or "btcValue" to open. Closes come first, and every opening position
+        gets the same share of the leveraged net value within the tradable balance left by the earlier ones."""
+        summary = snapshot["summary"]
+        netValue = float(summary["netValue"])
+        tradableBalance = netValue * self.leverage - float(summary["totalBorrowedValue"])
+        distributedBtcValue = float(self.floatToEighthDigit(netValue * self.leverage / len(self.coins)))
+        cancels, closes, opens = [], [], []
+        for coin, tradeSign in zip(self.coins, self.tradeSigns):
+            pair = self.basicCoin + "_" + coin
+            position = snapshot["positions"].get(pair, {"amount": "0.00000000", "type": "none"})
+            isOpening = position["amount"] != "0.00000000"
+            if isOpening and position["type"] != tradeSign:  # Position type is not the same with trade sign?
+                closes.append({"action": "close", "coin": coin, "pair": pair})
+                tradableBalance += abs(float(position["total"]))
+                isOpening = False
+            if not isOpening and tradeSign != "hold":
+                orderNumbers = [order["orderNumber"] for order in snapshot["openOrders"].get(pair, []) if int(order["margin"]) == 1]
+                if len(orderNumbers) != 0:
+                    cancels.append({"action": "cancel", "coin": coin, "pair": pair, "orderNumbers": orderNumbers})
+                opens.append({"action": tradeSign, "coin": coin, "pair": pair})
+        for action in opens:
+            action["btcValue"] = self.floatToEighthDigit(max(min(distributedBtcValue, tradableBalance), 0.0))
+            tradableBalance -= float(action["btcValue"])
+        return cancels + closes + opens
+
+    def executeMarginAction(self, action):
+        """Execute an action of planFitBalance and return the response."""
+        if action["action"] == "cancel":
+            failures = self.cancelOrders(action["orderNumbers"])
+            if len(failures) != 0:
+                return {"error": "Could not cancel orders: " + str(failures)}
+            return {"success": 1}
+        elif action["action"] == "close":
+            return self.closeMarginPosition(action["pair"])
+        return self.marginOrder("asks" if action["action"] == "long" else "bids", action["coin"], action["btcValue"])
+
+    def executeMarginPlan(self, plan):
+        """Execute actions of planFitBalance concurrently across coins and return results and failures of each coin.
+        Cancels and closes of every coin finish before any position is opened, as the opens use the freed balance.
+        Results of a coin are the responses of its actions in order. A coin whose cancel or close failed is not opened."""
+        results, failures = {}, {}
+        for phase in [["cancel", "close"], ["long", "short"]]:
+            actions = {}
+            for action in plan:
+                if action["action"] in phase:
+                    actions.setdefault(action["coin"], []).append(action)
+            tasks = [(coin, lambda coin: [self.executeMarginAction(action) for action in actions[coin]], None)
+                     for coin in self.coins if coin in actions and coin not in failures]
+            phaseResults, phaseFailures = self.coinExecutor.run(tasks)
+            for coin, responses in phaseResults.items():
+                results.setdefault(coin, []).extend(responses or [])
+            failures.update(phaseFailures)
+        return results, failures
+
     def fitBalance(self):
-        """Re-take your positions based on the trading sign."""
-        position = self.getOpeningMarginPosition()
-        for coinIndex in range(len(self.coins)):
-            if type(position)!=pd.core.frame.DataFrame: # Hold nothing today?
-                if self.tradeSigns[coinIndex] != "hold":  # Trade sign is not "hold" ?
-                    if self.tradeSigns[coinIndex] == "long":  # Trade sign is "long" ?
-                        self.marketMarginBuy(self.coins[coinIndex], self.distributedBtcValue())
-                    else:
-                        self.marketMarginSell(self.coins[coinIndex], self.distributedBtcValue())
-            else:
-                if self.basicCoin + "_" + self.coins[coinIndex] in position.index:  # Opening the position?
-                    if position.loc[self.basicCoin + "_" + self.coins[coinIndex]]["type"] != self.tradeSigns[coinIndex]: # Position type is not the same with trade sign?
-                        self.closeMarginPosition(self.basicCoin + "_" + self.coins[coinIndex])
-                        if self.tradeSigns[coinIndex] != "hold":  # Trade sign is not "hold" ?
-                            if self.tradeSigns[coinIndex] == "long":  # Trade sign is "long" ?
-                                self.marketMarginBuy(self.coins[coinIndex], self.distributedBtcValue())
-                            else:
-                                self.marketMarginSell(self.coins[coinIndex], self.distributedBtcValue())
-                else:
-                    if self.tradeSigns[coinIndex] != "hold":  # Trade sign is not "hold" ?
-                        if self.tradeSigns[coinIndex] == "long":  # Trade sign is "long" ?
-                            self.marketMarginBuy(self.coins[coinIndex], self.distributedBtcValue())
-                        else:
-                            self.marketMarginSell(self.coins[coinIndex], self.distributedBtcValue())
+        """Re-take your positions based on the trading sign and return results and failures of each coin."""
+        return self.executeMarginPlan(self.planFitBalance(self.takeMarginSnapshot()))
 
     def closeAllOpeningMarginPosition(self):
         """Close all your positions."""
@@ -0,0 +1,83 @@
+import time
+import threading
+import numpy as np
+
+
+class OrderBook(object):
+    def __init__(self, levels):
+        """One side("asks" or "bids") of an order book given as [[rate, amount], ...] in the order of Poloniex.
+        Rates are kept as the strings Poloniex returned so that they are sent back without float formatting."""
+        if len(levels) == 0:
+            raise ValueError("The order book is empty.")
+        self.rateStrings = [level[0] for level in levels]
+        levels = np.array(levels, dtype=float)
+        self.rates = levels[:, 0]
+        self.amounts = levels[:, 1]
+        self.cumAmounts = np.cumsum(self.amounts)
+        self.cumBtcValues = np.cumsum(self.rates * self.amounts)
+
+    def fillLevel(self, cumValues, target):
+        """Return the first level whose cumulative value exceeds target, or the last level if none does."""
+        return min(int(np.searchsorted(cumValues, float(target), side="right")), len(cumValues) - 1)
+
+    def rateAndAmount(self, btcValue, formatRate=None):
+        """Return the limit rate and coin amount to trade btcValue at market price.
+        The amount is computed with formatRate(rate) if it is given, as the order is sent at that rate."""
+        level = self.fillLevel(self.cumBtcValues, btcValue)
+        rate = self.rateStrings[level] if formatRate is None else formatRate(self.rateStrings[level])
+        return rate, self.cumAmounts[level] - (self.cumBtcValues[level] - float(btcValue)) / float(rate)
+
+    def rateAndBtcValue(self, coinAmount, formatRate=None):
+        """Return the limit rate and btc value to trade coinAmount at market price."""
+        level = self.fillLevel(self.cumAmounts, coinAmount)
+        rate = self.rateStrings[level] if formatRate is None else formatRate(self.rateStrings[level])
+        return rate, self.cumBtcValues[level] - (self.cumAmounts[level] - float(coinAmount)) * float(rate)
+
+
+class OrderBookFetcher(object):
+    def __init__(self, polo, initialDepth=20, maxDepth=1000, depthFactor=5):
+        """Fetch order books of polo from initialDepth and deepen them by depthFactor up to maxDepth
+        only while the target of the order is not covered. The deepest snapshot of each pair is reused
+        for the TTL of returnOrderBook in the response cache of polo until the cache is invalidated by a trade."""
+        self.polo = polo
+        self.initialDepth = initialDepth
+        self.maxDepth = maxDepth
+        self.depthFactor = depthFactor
+        self.snapshots = {}
+        self.lock = threading.Lock()
+
+    def cacheState(self):
+        """Return TTL of snapshots and the generation of the response cache."""
+        if self.polo.responseCache is None:
+            return 0, None
+        return self.polo.responseCache.ttls.get("returnOrderBook", 0), self.polo.responseCache.generation
+
+    def isCovered(self, book, numLevels, depth, btcValue, coinAmount):
+        if numLevels < depth:  # The whole book is fetched
+            return True
+        if btcValue is not None:
+            return book.cumBtcValues[-1] > float(btcValue)
+        if coinAmount is not None:
+            return book.cumAmounts[-1] > float(coinAmount)
+        return False
+
+    def load(self, pair, orderStr, btcValue=None, coinAmount=None):
+        """Return OrderBook of the side orderStr("asks" or "bids") of pair deep enough to trade btcValue or coinAmount.
+        Without a target the book is fetched at maxDepth."""
+        ttl, generation = self.cacheState()
+        with self.lock:
+            snapshot = self.snapshots.get(pair)
+        if snapshot is not None and time.time() < snapshot[0] and snapshot[1] == generation:
+            depth, response = snapshot[2], snapshot[3]
+        else:
+            depth, response = 0, None
+        while True:
+            if response is not None:
+                book = OrderBook(response[orderStr])
+                if depth >= self.maxDepth or self.isCovered(book, len(response[orderStr]), depth, btcValue, coinAmount):
+                    return book
+            depth = min(max(self.initialDepth, depth * self.depthFactor), self.maxDepth)
+            response = self.polo.returnOrderBook(pair=pair, depth=depth)
+            if ttl > 0:
+                with self.lock:
+                    self.snapshots[pair] = (time.time() + ttl, generation, depth, response)
@@ -0,0 +1,217 @@
+import time
+import json
+import hmac
+import hashlib
+import logging
+import threading
+import requests
+from multiprocessing.pool import ThreadPool
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+import poloniex
+from ..ratelimiter import RateLimiter, sharedRateLimiter
+from .responsecache import ResponseCache
+
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+
+try:
+    parseFloat = unicode
+except NameError:
+    parseFloat = str
+
+NONCE_ERROR = "Nonce must be greater"
+
+
+def isNonceError(response):
+    """Return True if Poloniex rejected a private command for its nonce. The command was not executed."""
+    return isinstance(response, dict) and str(response.get("error", "")).startswith(NONCE_ERROR)
+
+
+TRADING_COMMANDS = ["buy", "sell", "cancelOrder", "moveOrder", "marginBuy", "marginSell", "closeMarginPosition",
+                    "createLoanOffer", "cancelLoanOffer", "transferBalance", "withdraw"]
+
+
+class PooledPoloniex(poloniex.Poloniex):
+    publicUrl = "https://poloniex.com/public"
+    tradingUrl = "https://poloniex.com/tradingApi"
+
+    def __init__(self, Key=False, Secret=False, timeout=10, coach=True, loglevel=logging.WARNING, extend=True,
+                 poolSize=10, maxRetries=3, retryBackoff=0.5, cacheTtls=None):
+        """Poloniex client sending every command through one keep-alive session with a connection pool of poolSize.
+        Connection errors are retried maxRetries times with exponential backoff (retryBackoff * 2 ** n sec).
+        Read errors and 5xx responses are retried only for public commands because private ones are not idempotent.
+        Private commands rejected for their nonce are signed again and resent up to maxRetries times.
+        coach=True paces calls by the process-wide sharedRateLimiter, a RateLimiter paces them by itself.
+        cacheTtls({command: seconds}) caches responses of those commands until our next trading command."""
+        super(PooledPoloniex, self).__init__(Key, Secret, timeout, False, loglevel, extend)
+        self.Key, self.Secret, self.timeout = Key, Secret, timeout
+        if isinstance(coach, RateLimiter):
+            self.rateLimiter = coach
+        else:
+            self.rateLimiter = sharedRateLimiter if coach else None
+        self.poolSize, self.maxRetries = poolSize, maxRetries
+        self.lastNonce = 0
+        self.nonceLock = threading.Lock()
+        self.session = self.newSession(poolSize, maxRetries, retryBackoff)
+        self.responseCache = None if cacheTtls is None else ResponseCache(cacheTtls)
+
+    def newSession(self, poolSize, maxRetries, retryBackoff):
+        """Return requests.Session with a pooled adapter and retry policy."""
+        retry = Retry(total=maxRetries, connect=maxRetries, read=maxRetries, backoff_factor=retryBackoff,
+                      status_forcelist=[500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def nextNonce(self):
+        """Return a nonce greater than any nonce returned before.
+        Milli seconds like the original wrapper, so that other clients on the same key are not left behind."""
+        with self.nonceLock:
+            self.lastNonce = max(self.lastNonce + 1, int(time.time() * 1000))
+            return self.lastNonce
+
+    def commandClass(self, command):
+        """Return the rate limiter class of command: "public", "private" or "trading"."""
+        if command in TRADING_COMMANDS:
+            return "trading"
+        elif command in poloniex.PRIVATE_COMMANDS:
+            return "private"
+        return "public"
+
+    def waitRateLimiter(self, commandClass):
+        """Wait until a call of commandClass is within the rate limit."""
+        if self.rateLimiter is not None:
+            self.rateLimiter.wait(commandClass)
+
+    def prepareRequest(self, command, args={}):
+        """Return method, url, body and headers of command."""
+        args = dict(args)
+        args["command"] = command
+        if command in poloniex.PRIVATE_COMMANDS:
+            if not self.Key or not self.Secret:
+                raise ValueError("A Key and Secret needed!")
+            args["nonce"] = self.nextNonce()
+            postData = urlencode(args)
+            sign = hmac.new(self.Secret.encode("utf-8"), postData.encode("utf-8"), hashlib.sha512)
+            return "POST", self.tradingUrl, postData, {"Sign": sign.hexdigest(), "Key": self.Key,
+                                                       "Content-Type": "application/x-www-form-urlencoded"}
+        elif command in poloniex.PUBLIC_COMMANDS:
+            return "GET", self.publicUrl + "?" + urlencode(args), None, {}
+        else:
+            raise ValueError("Invalid Command!")
+
+    def decodeResponse(self, text):
+        """Return decoded json keeping floats as strings like the original wrapper."""
+        return json.loads(text, parse_float=parseFloat)
+
+    def sendRequest(self, method, url, data, headers):
+        """Send a prepared request through the pooled session and return decoded json."""
+        ret = self.session.request(method, url, data=data, headers=headers, timeout=self.timeout)
+        return self.decodeResponse(ret.text)
+
+    def sendCommand(self, command, args={}):
+        """Send command with args to Poloniex bypassing the cache and return decoded json."""
+        # --- Wait before making the nonce so that a waiting call does not send an older nonce after a newer one.
+        self.waitRateLimiter(self.commandClass(command))
+        response = self.sendRequest(*self.prepareRequest(command, args))
+        # --- Concurrent private calls can reach Poloniex out of nonce order. A rejected call was not executed.
+        for retry in range(self.maxRetries):
+            if not isNonceError(response):
+                break
+            self.waitRateLimiter(self.commandClass(command))
+            response = self.sendRequest(*self.prepareRequest(command, args))
+        return response
+
+    def invalidateCache(self):
+        """Drop cached responses, e.g. after balances are changed outside of this client."""
+        if self.responseCache is not None:
+            self.responseCache.invalidate()
+
+    def readCache(self, command, args):
+        """Return (True, response) if a fresh response of command with args is cached,
+        otherwise (False, generation) to pass to writeCache(). generation is None if command is not cached."""
+        if self.responseCache is None or not self.responseCache.isCached(command):
+            return False, None
+        return self.responseCache.get(command, args)
+
+    def writeCache(self, command, args, response, generation):
+        """Store response of command read at generation by readCache(), or drop every response after a trading command.
+        Also called with response None when command raised, because a trading command may have been executed."""
+        if command in TRADING_COMMANDS:
+            self.invalidateCache()
+        elif generation is not None and response is not None:
+            self.responseCache.put(command, args, response, generation)
+
+    def __call__(self, command, args={}):
+        """Return the cached response of command with args or send it to Poloniex and return decoded json."""
+        cached, value = self.readCache(command, args)
+        if cached:
+            return value
+        response = None
+        try:
+            response = self.sendCommand(command, args)
+            return response
+        finally:
+            self.writeCache(command, args, response, value)
+
+    def cancelOrders(self, orderNumbers, workers=None):
+        """Cancel orders concurrently and return {orderNumber: reason} of the rejected cancels."""
+        orderNumbers = [str(orderNumber) for orderNumber in orderNumbers]
+        if len(orderNumbers) == 0:
+            return {}
+        pool = ThreadPool(min(workers or self.poolSize, len(orderNumbers)))
+        try:
+            responses = pool.map(self.cancelOrder, orderNumbers)
+        finally:
+            pool.close()
+            pool.join()
+        failures = {}
+        for orderNumber, response in zip(orderNumbers, responses):
+            if not (isinstance(response, dict) and int(response.get("success", 0)) == 1):
+                failures[orderNumber] = response.get("error", str(response)) if isinstance(response, dict) else str(response)
+        return failures
+
+    def cancelOpenOrders(self, pair, margin=None, workers=None):
+        """Cancel open orders of pair concurrently (only exchange orders if margin is 0, only margin orders if 1).
+        Open orders are listed once before and once after the cancels, both bypassing the response cache
+        because orders filled by the market meanwhile must not be canceled nor reported.
+        Return {orderNumber: reason} of the orders that could not be canceled."""
+        args = {"currencyPair": str(pair).upper()}
+        orderNumbers = [str(order["orderNumber"]) for order in self.sendCommand("returnOpenOrders", args)
+                        if margin is None or int(order["margin"]) == margin]
+        if len(orderNumbers) == 0:
+            return {}
+        failures = self.cancelOrders(orderNumbers, workers)
+        openOrderNumbers = [str(order["orderNumber"]) for order in self.sendCommand("returnOpenOrders", args)]
+        for orderNumber in orderNumbers:
+            if orderNumber in openOrderNumbers and orderNumber not in failures:
+                failures[orderNumber] = "Still open after cancel."
+        return failures
+
+    def marketTradeHist(self, pair, start=False, end=False):
+        """Return public trade history for pair from start(default: 1 hour ago) to end(default: now)."""
+        if not end:
+            end = time.time()
+        if not start:
+            start = end - self.HOUR
+        args = {"command": "returnTradeHistory", "currencyPair": str(pair).upper(), "start": str(start), "end": str(end)}
+        self.waitRateLimiter("public")
+        return self.sendRequest("GET", self.publicUrl + "?" + urlencode(args), None, {})
+
+
+_sharedPublicPoloniex = None
+_sharedPublicPoloniexLock = threading.Lock()
+
+
+def sharedPublicPoloniex():
+    """Return the process-wide PooledPoloniex for public commands so that its connections are reused."""
+    global _sharedPublicPoloniex
+    with _sharedPublicPoloniexLock:
+        if _sharedPublicPoloniex is None:
+            _sharedPublicPoloniex = PooledPoloniex(timeout=10, coach=True, extend=True)
+        return _sharedPublicPoloniex
@@ -0,0 +1,68 @@
+import copy
+import time
+import threading
+
+# --- Market data only: our trading commands are the only invalidation, so responses changed by the market are not cached.
+DEFAULT_CACHE_TTLS = {
+    "returnTicker": 10,
+    "returnFeeInfo": 60,
+}
+
+# --- Opt-in, e.g. cacheTtls=dict(DEFAULT_CACHE_TTLS, **ACCOUNT_CACHE_TTLS). Changes by the market, such as fills
+# of our resting orders, and by other clients on the same key are not seen until the TTL ends or our next trading command.
+ORDER_BOOK_CACHE_TTLS = {
+    "returnOrderBook": 2,
+}
+
+ACCOUNT_CACHE_TTLS = {
+    "returnBalances": 10,
+    "returnCompleteBalances": 10,
+    "returnAvailableAccountBalances": 10,
+    "returnTradableBalances": 10,
+    "returnOpenOrders": 10,
+    "returnMarginAccountSummary": 10,
+    "getMarginPosition": 10,
+}
+
+
+class ResponseCache(object):
+    def __init__(self, ttls=None):
+        """Read-through cache of responses with a TTL(seconds) per command. Commands not in ttls are not cached.
+        invalidate() drops everything and increases generation, so a response requested before it is not stored after it.
+        Every caller gets its own copy of a cached response, so modifying it does not change the cache."""
+        self.ttls = DEFAULT_CACHE_TTLS if ttls is None else ttls
+        self.entries = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, command, args):
+        return command, tuple(sorted([(str(name), str(value)) for name, value in args.items()]))
+
+    def isCached(self, command):
+        return self.ttls.get(command, 0) > 0
+
+    def get(self, command, args):
+        """Return (True, response) if a fresh response is cached, otherwise (False, generation)."""
+        with self.lock:
+            entry = self.entries.get(self.key(command, args))
+            if entry is None or time.time() >= entry[0]:
+                self.misses += 1
+                return False, self.generation
+            self.hits += 1
+        return True, copy.deepcopy(entry[1])
+
+    def put(self, command, args, response, generation):
+        """Store response unless the cache was invalidated after generation or Poloniex returned an error."""
+        if isinstance(response, dict) and "error" in response:
+            return
+        with self.lock:
+            if generation == self.generation:
+                self.entries[self.key(command, args)] = (time.time() + self.ttls[command], copy.deepcopy(response))
+
+    def invalidate(self):
+        """Drop every response. Called after each trading command because it changes balances, orders and books."""
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
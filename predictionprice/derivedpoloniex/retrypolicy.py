@@ -0,0 +1,97 @@
+import time
+
+# --- Substrings of Poloniex rejections by class. The others are "unknown".
+SIZE_REJECTIONS = ["not enough", "insufficient", "exceeds", "unable to place", "too large"]
+MINIMUM_REJECTIONS = ["total must be at least", "amount must be at least"]
+TRANSIENT_REJECTIONS = ["please try again", "nonce must be greater", "too many requests", "internal error",
+                        "temporarily", "timeout", "busy"]
+FATAL_REJECTIONS = ["invalid", "permission", "disabled", "not allowed", "frozen"]
+
+
+class RetryPolicy(object):
+    def __init__(self, maxAttempts=10, deadline=30, initialBackoff=0.5, backoffFactor=2.0, maxBackoff=8.0, lowerFraction=0.98):
+        """Retry policy of market orders rejected by Poloniex.
+        Orders are retried up to maxAttempts times within deadline seconds after a backoff of initialBackoff,
+        multiplied by backoffFactor each retry up to maxBackoff. Size and unknown rejections bisect the btc value
+        between the last rejected one and a lower end starting at lowerFraction of it. The lower end goes down
+        twice as far each time the bracket gets too narrow.
+        Transient rejections retry the same btc value. Minimum and fatal rejections are not retried."""
+        self.maxAttempts = maxAttempts
+        self.deadline = deadline
+        self.initialBackoff = initialBackoff
+        self.backoffFactor = backoffFactor
+        self.maxBackoff = maxBackoff
+        self.lowerFraction = lowerFraction
+
+    def isAccepted(self, response):
+        return isinstance(response, dict) and "error" not in response \
+            and (int(response.get("success", 1)) == 1 or "orderNumber" in response)
+
+    def rejectionMessage(self, response):
+        """Return the message of a rejected response, which may not be a dict."""
+        if isinstance(response, dict):
+            return str(response.get("error", response.get("message", "Rejected.")))
+        return str(response)
+
+    def classify(self, response):
+        """Return "size", "minimum", "transient", "fatal" or "unknown" of a rejected response."""
+        message = self.rejectionMessage(response).lower()
+        for rejectionClass, patterns in [("minimum", MINIMUM_REJECTIONS), ("size", SIZE_REJECTIONS),
+                                         ("transient", TRANSIENT_REJECTIONS), ("fatal", FATAL_REJECTIONS)]:
+            for pattern in patterns:
+                if pattern in message:
+                    return rejectionClass
+        return "unknown"
+
+    def backoff(self, retry):
+        return min(self.initialBackoff * self.backoffFactor ** retry, self.maxBackoff)
+
+    def run(self, placeOrder, btcValue, maxBtcValue=None):
+        """Call placeOrder(btcValue) until it is accepted and return its last response with "retryReport" of
+        attempts, elapsedTime, btcValue and rejections. A response given up on always has "error".
+        placeOrder returns None when the order is too small to place. That is returned as it is at the first attempt,
+        and after rejections the last rejection is returned as given up on.
+        maxBtcValue() is called once at the first size rejection to cap the bracket, e.g. by the tradable balance."""
+        startTime = time.time()
+        upper = float(btcValue)
+        lower = upper * self.lowerFraction
+        size = upper
+        rejections = []
+        attempt = 0
+        widenings = 0
+        while True:
+            attempt += 1
+            placedResponse = placeOrder(size)
+            elapsedTime = time.time() - startTime
+            if placedResponse is None:
+                if len(rejections) == 0:
+                    return None
+                # --- The bisection went below the minimum order: give up on the last rejection.
+                attempt -= 1
+                size = rejections[-1][2]
+                break
+            response = placedResponse
+            if self.isAccepted(response):
+                break
+            rejectionClass = self.classify(response)
+            rejections.append((rejectionClass, self.rejectionMessage(response), size))
+            backoff = self.backoff(attempt - 1)
+            if rejectionClass in ["minimum", "fatal"] or attempt >= self.maxAttempts or elapsedTime + backoff >= self.deadline:
+                break
+            if rejectionClass in ["size", "unknown"]:
+                upper = size
+                if maxBtcValue is not None:
+                    upper = min(upper, float(maxBtcValue()))
+                    maxBtcValue = None
+                if lower >= upper * (1.0 - (1.0 - self.lowerFraction) / 2.0):  # Too narrow to find an accepted value?
+                    widenings += 1
+                    lower = upper * max(1.0 - (1.0 - self.lowerFraction) * 2 ** widenings, 0.0)
+                size = (lower + upper) / 2.0
+            time.sleep(backoff)
+        if self.isAccepted(response):
+            response = dict(response)
+        else:
+            response = dict(response) if isinstance(response, dict) else {}
+            response["error"] = rejections[-1][1]
+        response["retryReport"] = {"attempts": attempt, "elapsedTime": elapsedTime, "btcValue": size, "rejections": rejections}
+        return response
@@ -0,0 +1,458 @@
+import json
+import time
+import random
+import threading
+from collections import defaultdict
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qsl
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qsl
+
+
+def eighthDigit(number):
+    """Format number like Poloniex does."""
+    return "{0:.8f}".format(float(number))
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class StandInPoloniexServer(object):
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, errorRate=0.0, enforceNonce=True, leverage=2.5, seed=None):
+        """Local HTTP stand-in of the Poloniex public and trading API used by the trading classes.
+        It keeps order books, balances, open orders and margin positions in memory and fills orders against the books.
+        latency (seconds, or {command: seconds} with None as default) is slept before each response,
+        errorRate (probability, or {command: probability}) answers {"error": ...} at random,
+        recorded responses set by setRecording() or loadRecording() are replayed instead of the simulation,
+        and every call is counted in callCounts. Point a client to it with connect()."""
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.errorRate = errorRate
+        self.enforceNonce = enforceNonce
+        self.leverage = leverage
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        self.callCounts = defaultdict(int)
+        self.callLog = []
+        self.recordings = {}
+        self.injectedErrors = defaultdict(list)
+        self.lastNonce = 0
+        # --- Exchange state
+        self.orderBooks = {}
+        self.tickers = {}
+        self.chartData = {}
+        self.balances = {"exchange": defaultdict(float), "margin": defaultdict(float)}
+        self.openOrders = []
+        self.nextOrderNumber = 1000000
+        self.nextTradeId = 1
+        self.marginPositions = {}
+        self.server = None
+        self.thread = None
+        self.handlers = {
+            "returnTicker": self.returnTicker,
+            "return24hVolume": self.return24hVolume,
+            "returnOrderBook": self.returnOrderBook,
+            "returnChartData": self.returnChartData,
+            "returnTradeHistory": self.returnTradeHistory,
+            "returnBalances": self.returnBalances,
+            "returnCompleteBalances": self.returnCompleteBalances,
+            "returnOpenOrders": self.returnOpenOrders,
+            "cancelOrder": self.cancelOrder,
+            "buy": self.buy,
+            "sell": self.sell,
+            "marginBuy": self.marginBuy,
+            "marginSell": self.marginSell,
+            "closeMarginPosition": self.closeMarginPosition,
+            "getMarginPosition": self.getMarginPosition,
+            "returnMarginAccountSummary": self.returnMarginAccountSummary,
+            "returnTradableBalances": self.returnTradableBalances,
+        }
+
+    # -----------------------------------------------------------------------
+    # Server
+    # -----------------------------------------------------------------------
+    def start(self):
+        """Start serving on a background thread and return self."""
+        standIn = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self.respond(dict(parse_qsl(urlparse(self.path).query)), False)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+                self.respond(dict(parse_qsl(body)), True)
+
+            def respond(self, args, private):
+                status, response = standIn.dispatch(args.pop("command", ""), args, private)
+                body = json.dumps(response).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def publicUrl(self):
+        return "http://" + self.host + ":" + str(self.port) + "/public"
+
+    def tradingUrl(self):
+        return "http://" + self.host + ":" + str(self.port) + "/tradingApi"
+
+    def connect(self, client):
+        """Point a PooledPoloniex(or derived class) client to this server and return it."""
+        client.publicUrl = self.publicUrl()
+        client.tradingUrl = self.tradingUrl()
+        return client
+
+    def dispatch(self, command, args, private):
+        """Count the call, inject latency and errors, replay recordings or simulate and return (status, response)."""
+        with self.lock:
+            self.callCounts[command] += 1
+            self.callLog.append((time.time(), command, args))
+        latency = self.latency.get(command, self.latency.get(None, 0.0)) if isinstance(self.latency, dict) else self.latency
+        if latency > 0:
+            time.sleep(latency)
+        with self.lock:
+            if len(self.injectedErrors[command]) != 0:
+                return self.injectedErrors[command].pop(0)
+            errorRate = self.errorRate.get(command, self.errorRate.get(None, 0.0)) if isinstance(self.errorRate, dict) else self.errorRate
+            if self.random.random() < errorRate:
+                return 200, {"error": "Injected error."}
+            if private and self.enforceNonce:
+                nonce = int(args.pop("nonce", 0))
+                if nonce <= self.lastNonce:
+                    return 200, {"error": "Nonce must be greater than " + str(self.lastNonce) + ". You provided " + str(nonce) + "."}
+                self.lastNonce = nonce
+            if command in self.recordings and len(self.recordings[command]) != 0:
+                # --- The last recorded response is repeated after the others are used up.
+                responses = self.recordings[command]
+                return 200, responses.pop(0) if len(responses) > 1 else responses[0]
+            if command not in self.handlers:
+                return 200, {"error": "Invalid command."}
+            return 200, self.handlers[command](args)
+
+    # -----------------------------------------------------------------------
+    # Set up
+    # -----------------------------------------------------------------------
+    def setOrderBook(self, pair, asks, bids):
+        """Set order book of pair as [[rate, amount], ...]. Asks ascend and bids descend in rate."""
+        with self.lock:
+            self.orderBooks[pair] = {"asks": sorted([[round(float(r), 8), float(a)] for r, a in asks]),
+                                     "bids": sorted([[round(float(r), 8), float(a)] for r, a in bids], reverse=True)}
+            if pair not in self.tickers and len(asks) != 0 and len(bids) != 0:
+                self.setTicker(pair, (self.orderBooks[pair]["asks"][0][0] + self.orderBooks[pair]["bids"][0][0]) / 2.0)
+
+    def setTicker(self, pair, last):
+        """Set the last price of pair."""
+        with self.lock:
+            self.tickers[pair] = float(last)
+
+    def setBalance(self, coin, amount, account="exchange"):
+        """Set available amount of coin in account("exchange" or "margin")."""
+        with self.lock:
+            self.balances[account][coin] = float(amount)
+
+    def setChartData(self, pair, candles):
+        """Set candles of pair as list of dict returned by returnChartData."""
+        with self.lock:
+            self.chartData[pair] = list(candles)
+
+    def setRecording(self, command, responses):
+        """Replay responses of command in order, repeating the last one."""
+        with self.lock:
+            self.recordings[command] = list(responses)
+
+    def loadRecording(self, filePath):
+        """Replay responses recorded in a json file as {command: [response, ...]}."""
+        with open(filePath) as f:
+            for command, responses in json.load(f).items():
+                self.setRecording(command, responses)
+
+    def injectError(self, command, response=None, status=200, count=1):
+        """Answer the next count calls of command with response(default: {"error": "Injected error."})."""
+        if response is None:
+            response = {"error": "Injected error."}
+        with self.lock:
+            self.injectedErrors[command].extend([(status, response)] * count)
+
+    def resetCallCounts(self):
+        """Clear callCounts and callLog."""
+        with self.lock:
+            self.callCounts.clear()
+            self.callLog = []
+
+    # -----------------------------------------------------------------------
+    # Simulation
+    # -----------------------------------------------------------------------
+    def lastPrice(self, coin, basicCoin="BTC"):
+        if coin == basicCoin:
+            return 1.0
+        return self.tickers.get(basicCoin + "_" + coin, 0.0)
+
+    def fill(self, pair, side, rate, amount):
+        """Fill amount against the side("asks" or "bids") of the book up to rate and return trades and filled amount."""
+        levels = self.orderBooks.setdefault(pair, {"asks": [], "bids": []})[side]
+        trades = []
+        remaining = float(amount)
+        while remaining > 1e-12 and len(levels) != 0:
+            levelRate, levelAmount = levels[0]
+            if (side == "asks" and levelRate > rate) or (side == "bids" and levelRate < rate):
+                break
+            fillAmount = min(remaining, levelAmount)
+            remaining -= fillAmount
+            if levelAmount - fillAmount <= 1e-12:
+                levels.pop(0)
+            else:
+                levels[0][1] = levelAmount - fillAmount
+            trades.append({"amount": eighthDigit(fillAmount), "rate": eighthDigit(levelRate),
+                           "total": eighthDigit(fillAmount * levelRate), "tradeID": str(self.nextTradeId),
+                           "date": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+                           "type": "buy" if side == "asks" else "sell"})
+            self.nextTradeId += 1
+            self.tickers[pair] = levelRate
+        return trades, float(amount) - remaining
+
+    def newOrderNumber(self):
+        self.nextOrderNumber += 1
+        return str(self.nextOrderNumber)
+
+    def returnTicker(self, args):
+        return dict([(pair, {"last": eighthDigit(last), "lowestAsk": eighthDigit(last), "highestBid": eighthDigit(last),
+                             "percentChange": "0.00000000", "baseVolume": "0.00000000", "quoteVolume": "0.00000000",
+                             "isFrozen": "0", "high24hr": eighthDigit(last), "low24hr": eighthDigit(last)})
+                     for pair, last in self.tickers.items()])
+
+    def return24hVolume(self, args):
+        return dict([(pair, {pair.split("_")[0]: "0.00000000", pair.split("_")[1]: "0.00000000"}) for pair in self.tickers])
+
+    def returnOrderBook(self, args):
+        depth = int(args.get("depth", 20))
+
+        def book(pair):
+            orderBook = self.orderBooks.get(pair, {"asks": [], "bids": []})
+            return {"asks": [[eighthDigit(r), a] for r, a in orderBook["asks"][:depth]],
+                    "bids": [[eighthDigit(r), a] for r, a in orderBook["bids"][:depth]],
+                    "isFrozen": "0", "seq": self.nextTradeId}
+        if args.get("currencyPair", "all").upper() == "ALL":
+            return dict([(pair, book(pair)) for pair in self.orderBooks])
+        return book(args["currencyPair"])
+
+    def returnChartData(self, args):
+        start, end = float(args.get("start", 0)), float(args.get("end", time.time()))
+        candles = [candle for candle in self.chartData.get(args.get("currencyPair"), []) if start <= candle["date"] <= end]
+        if len(candles) == 0:
+            return [{"date": 0, "high": 0, "low": 0, "open": 0, "close": 0, "volume": 0, "quoteVolume": 0, "weightedAverage": 0}]
+        return candles
+
+    def returnTradeHistory(self, args):
+        return []
+
+    def returnBalances(self, args):
+        return dict([(coin, eighthDigit(amount)) for coin, amount in self.balances["exchange"].items()])
+
+    def returnCompleteBalances(self, args):
+        balances = {}
+        for coin, available in self.balances["exchange"].items():
+            onOrders = sum([order["amount"] * (order["rate"] if order["type"] == "buy" else 1.0) for order in self.openOrders
+                            if order["margin"] == 0 and order["lockedCoin"] == coin])
+            balances[coin] = {"available": eighthDigit(available),
+                              "btcValue": eighthDigit((available + onOrders) * self.lastPrice(coin)),
+                              "onOrders": eighthDigit(onOrders)}
+        return balances
+
+    def openOrderEntry(self, order):
+        return {"orderNumber": order["orderNumber"], "type": order["type"], "rate": eighthDigit(order["rate"]),
+                "startingAmount": eighthDigit(order["amount"]), "amount": eighthDigit(order["amount"]),
+                "total": eighthDigit(order["amount"] * order["rate"]), "date": order["date"], "margin": order["margin"]}
+
+    def returnOpenOrders(self, args):
+        pair = args.get("currencyPair", "all").upper()
+        if pair == "ALL":
+            return dict([(bookPair, [self.openOrderEntry(order) for order in self.openOrders if order["pair"] == bookPair])
+                         for bookPair in self.orderBooks])
+        return [self.openOrderEntry(order) for order in self.openOrders if order["pair"] == pair]
+
+    def cancelOrder(self, args):
+        for order in self.openOrders:
+            if order["orderNumber"] == str(args.get("orderNumber")):
+                self.openOrders.remove(order)
+                if order["margin"] == 0:
+                    lockedAmount = order["amount"] * (order["rate"] if order["type"] == "buy" else 1.0)
+                    self.balances["exchange"][order["lockedCoin"]] += lockedAmount
+                return {"success": 1, "amount": eighthDigit(order["amount"]),
+                        "message": "Order #" + order["orderNumber"] + " canceled."}
+        return {"error": "Invalid order number, or you are not the person who placed the order."}
+
+    def exchangeOrder(self, args, orderType):
+        pair = args["currencyPair"].upper()
+        basicCoin, coin = pair.split("_")
+        rate, amount = float(args["rate"]), float(args["amount"])
+        exchange = self.balances["exchange"]
+        if orderType == "buy" and rate * amount > exchange[basicCoin] + 1e-12:
+            return {"error": "Not enough " + basicCoin + "."}
+        if orderType == "sell" and amount > exchange[coin] + 1e-12:
+            return {"error": "Not enough " + coin + "."}
+        if rate * amount < 0.0001:
+            return {"error": "Total must be at least 0.0001."}
+        trades, filledAmount = self.fill(pair, "asks" if orderType == "buy" else "bids", rate, amount)
+        filledTotal = sum([float(trade["total"]) for trade in trades])
+        restAmount = amount - filledAmount
+        if orderType == "buy":
+            exchange[basicCoin] -= filledTotal + restAmount * rate
+            exchange[coin] += filledAmount
+        else:
+            exchange[coin] -= amount
+            exchange[basicCoin] += filledTotal
+        orderNumber = self.newOrderNumber()
+        if restAmount > 1e-12:
+            self.openOrders.append({"orderNumber": orderNumber, "pair": pair, "type": orderType, "rate": rate, "amount": restAmount,
+                                    "margin": 0, "lockedCoin": basicCoin if orderType == "buy" else coin,
+                                    "date": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())})
+        return {"orderNumber": orderNumber, "resultingTrades": trades}
+
+    def buy(self, args):
+        return self.exchangeOrder(args, "buy")
+
+    def sell(self, args):
+        return self.exchangeOrder(args, "sell")
+
+    def totalBorrowedValue(self):
+        return sum([abs(position["amount"]) * position["basePrice"] for position in self.marginPositions.values()])
+
+    def netValue(self):
+        pl = sum([self.positionPl(pair) for pair in self.marginPositions])
+        return self.balances["margin"]["BTC"] + pl
+
+    def positionPl(self, pair):
+        position = self.marginPositions[pair]
+        return (self.tickers.get(pair, position["basePrice"]) - position["basePrice"]) * position["amount"]
+
+    def tradableBalance(self):
+        return max(self.netValue() * self.leverage - self.totalBorrowedValue(), 0.0)
+
+    def marginOrder(self, args, orderType):
+        pair = args["currencyPair"].upper()
+        rate, amount = float(args["rate"]), float(args["amount"])
+        if rate * amount > self.tradableBalance() + 1e-12:
+            return {"success": 0, "error": "Not enough BTC available to borrow.", "message": "Not enough BTC available to borrow."}
+        if rate * amount < 0.0001:
+            return {"success": 0, "error": "Total must be at least 0.0001.", "message": "Total must be at least 0.0001."}
+        trades, filledAmount = self.fill(pair, "asks" if orderType == "buy" else "bids", rate, amount)
+        if filledAmount > 0:
+            self.updatePosition(pair, trades, filledAmount if orderType == "buy" else -filledAmount)
+        orderNumber = self.newOrderNumber()
+        if amount - filledAmount > 1e-12:
+            self.openOrders.append({"orderNumber": orderNumber, "pair": pair, "type": orderType, "rate": rate,
+                                    "amount": amount - filledAmount, "margin": 1, "lockedCoin": "BTC",
+                                    "date": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())})
+        return {"success": 1, "message": "Margin order placed.", "orderNumber": orderNumber, "resultingTrades": {pair: trades}}
+
+    def updatePosition(self, pair, trades, signedAmount):
+        """Add the fills of a margin order to the position of pair. The amount that reduces the position realizes
+        its P/L at the base price into the margin balance, the amount beyond it opens the other side at its own fills."""
+        position = self.marginPositions.setdefault(pair, {"amount": 0.0, "basePrice": 0.0})
+        closedAmount = min(abs(position["amount"]), abs(signedAmount)) if position["amount"] * signedAmount < 0 else 0.0
+        closedTotal = self.totalOfFirst(trades, closedAmount)
+        openedAmount = abs(signedAmount) - closedAmount
+        openedTotal = sum([float(trade["total"]) for trade in trades]) - closedTotal
+        if closedAmount > 0:
+            direction = 1.0 if position["amount"] > 0 else -1.0
+            self.balances["margin"]["BTC"] += direction * (closedTotal - closedAmount * position["basePrice"])
+            position["amount"] -= direction * closedAmount
+            if abs(position["amount"]) <= 1e-12:
+                position["amount"], position["basePrice"] = 0.0, 0.0
+        if openedAmount > 1e-12:
+            # --- Adding to the position averages the base price, a flipped remainder starts from its fills.
+            position["basePrice"] = (position["basePrice"] * abs(position["amount"]) + openedTotal) / (abs(position["amount"]) + openedAmount)
+            position["amount"] += openedAmount if signedAmount > 0 else -openedAmount
+        if abs(position["amount"]) <= 1e-12:
+            del self.marginPositions[pair]
+
+    def totalOfFirst(self, trades, amount):
+        """Return the btc total of the first amount of coins filled by trades in the order they were filled."""
+        total = 0.0
+        for trade in trades:
+            if amount <= 0:
+                break
+            tradeAmount = min(float(trade["amount"]), amount)
+            total += tradeAmount * float(trade["rate"])
+            amount -= tradeAmount
+        return total
+
+    def marginBuy(self, args):
+        return self.marginOrder(args, "buy")
+
+    def marginSell(self, args):
+        return self.marginOrder(args, "sell")
+
+    def closeMarginPosition(self, args):
+        pair = args["currencyPair"].upper()
+        if pair not in self.marginPositions:
+            return {"success": 1, "message": "You do not have an open position in this market.", "resultingTrades": {}}
+        position = self.marginPositions.pop(pair)
+        side = "bids" if position["amount"] > 0 else "asks"
+        trades, filledAmount = self.fill(pair, side, 0.0 if side == "bids" else float("inf"), abs(position["amount"]))
+        filledTotal = sum([float(trade["total"]) for trade in trades])
+        if position["amount"] > 0:
+            self.balances["margin"]["BTC"] += filledTotal - filledAmount * position["basePrice"]
+        else:
+            self.balances["margin"]["BTC"] += filledAmount * position["basePrice"] - filledTotal
+        return {"success": 1, "message": "Successfully closed margin position.", "resultingTrades": {pair: trades}}
+
+    def positionEntry(self, pair):
+        if pair not in self.marginPositions:
+            return {"amount": "0.00000000", "total": "0.00000000", "basePrice": "0.00000000", "liquidationPrice": -1,
+                    "pl": "0.00000000", "lendingFees": "0.00000000", "type": "none"}
+        position = self.marginPositions[pair]
+        return {"amount": eighthDigit(position["amount"]),
+                "total": eighthDigit(position["amount"] * self.tickers.get(pair, position["basePrice"])),
+                "basePrice": eighthDigit(position["basePrice"]), "liquidationPrice": -1,
+                "pl": eighthDigit(self.positionPl(pair)), "lendingFees": "0.00000000",
+                "type": "long" if position["amount"] > 0 else "short"}
+
+    def getMarginPosition(self, args):
+        pair = args.get("currencyPair", "all").upper()
+        if pair == "ALL":
+            return dict([(bookPair, self.positionEntry(bookPair)) for bookPair in set(list(self.orderBooks) + list(self.marginPositions))])
+        return self.positionEntry(pair)
+
+    def returnMarginAccountSummary(self, args):
+        netValue = self.netValue()
+        totalBorrowedValue = self.totalBorrowedValue()
+        pl = netValue - self.balances["margin"]["BTC"]
+        return {"totalValue": eighthDigit(self.balances["margin"]["BTC"]), "pl": eighthDigit(pl), "lendingFees": "0.00000000",
+                "netValue": eighthDigit(netValue), "totalBorrowedValue": eighthDigit(totalBorrowedValue),
+                "currentMargin": eighthDigit(netValue / totalBorrowedValue if totalBorrowedValue > 0 else 1.0)}
+
+    def returnTradableBalances(self, args):
+        tradable = self.tradableBalance()
+        return dict([(pair, {pair.split("_")[0]: eighthDigit(tradable),
+                             pair.split("_")[1]: eighthDigit(tradable / self.tickers[pair] if self.tickers.get(pair) else 0.0)})
+                     for pair in self.orderBooks])
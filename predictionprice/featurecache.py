@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2016 Tylor Darden
+Released under the MIT license
+http://opensource.org/licenses/mit-license.php
+"""
+import numpy as np
+
+
+def slidingWindow(sampleData, numFeature):
+    """Return read-only view of sampleData whose i-th row is sampleData[i:i + numFeature] without copying."""
+    sampleData = np.ascontiguousarray(sampleData, dtype=np.float64)
+    numWindow = max(len(sampleData) - numFeature + 1, 0)
+    return np.lib.stride_tricks.as_strided(sampleData, shape=(numWindow, numFeature),
+                                           strides=(sampleData.strides[0], sampleData.strides[0]), writeable=False)
+
+
+class FeatureCache(object):
+    def __init__(self, sampleData, classData, maxNumFeature, numTrainSamples=()):
+        """Sliding windows of sampleData at the largest numFeature and the standardization statistics
+        of the training samples, shared by every prediction window and every grid cell.
+        Statistics for the numbers of training samples in numTrainSamples are computed up front."""
+        self.sampleData = np.ascontiguousarray(sampleData, dtype=np.float64)
+        self.classData = np.asarray(classData)
+        self.maxNumFeature = maxNumFeature
+        # --- windows[i, :numFeature] is the feature vector starting at index i for every numFeature <= maxNumFeature.
+        self.windows = slidingWindow(self.sampleData, maxNumFeature)
+        self.cumSum = np.append(0.0, np.cumsum(self.sampleData))
+        self.cumSquareSum = np.append(0.0, np.cumsum(self.sampleData ** 2))
+        self.statistics = {}
+        for numTrainSample in numTrainSamples:
+            self.standardizationStatistics(numTrainSample)
+
+    def trainSample(self, trainStartIndex, numFeature, numTrainSample):
+        """Return training sample and teacher data as views of the cache."""
+        train_X = self.windows[trainStartIndex + 1:trainStartIndex + numTrainSample + 1, :numFeature]
+        train_y = self.classData[trainStartIndex:trainStartIndex + numTrainSample]
+        return train_X, train_y
+
+    def testSample(self, trainStartIndex, numFeature):
+        """Return the feature vector to predict as a view of the cache."""
+        return self.windows[trainStartIndex:trainStartIndex + 1, :numFeature]
+
+    def standardizationStatistics(self, numTrainSample):
+        """Return mean and scale of sampleData[s:s + numTrainSample] for every start index s.
+        Column j of the training sample at trainStartIndex is that window at s = trainStartIndex + 1 + j."""
+        if numTrainSample not in self.statistics:
+            n = float(numTrainSample)
+            mean = (self.cumSum[numTrainSample:] - self.cumSum[:-numTrainSample]) / n
+            variance = (self.cumSquareSum[numTrainSample:] - self.cumSquareSum[:-numTrainSample]) / n - mean ** 2
+            scale = np.sqrt(np.maximum(variance, 0.0))
+            scale[scale < 10 * np.finfo(np.float64).eps] = 1.0  # Same as StandardScaler for constant features
+            self.statistics[numTrainSample] = (mean, scale)
+        return self.statistics[numTrainSample]
+
+    def standardizedSample(self, trainStartIndex, numFeature, numTrainSample):
+        """Return training sample, teacher data and feature vector to predict standardized by the training sample."""
+        train_X, train_y = self.trainSample(trainStartIndex, numFeature, numTrainSample)
+        X = self.testSample(trainStartIndex, numFeature)
+        mean, scale = self.standardizationStatistics(numTrainSample)
+        mean = mean[trainStartIndex + 1:trainStartIndex + numFeature + 1]
+        scale = scale[trainStartIndex + 1:trainStartIndex + numFeature + 1]
+        return (train_X - mean) / scale, train_y, (X - mean) / scale
+
+    def sampleBatch(self, trainStartIndexes, numFeature, numTrainSample, standardization=False):
+        """Return training samples, teacher data and feature vectors to predict at every trainStartIndex at once
+        as arrays of shape (day, numTrainSample, numFeature), (day, numTrainSample) and (day, 1, numFeature).
+        With standardization, each day is standardized by its training sample as standardizedSample()."""
+        trainStartIndexes = np.asarray(trainStartIndexes, dtype=int).reshape(-1)
+        trainIndexes = trainStartIndexes[:, np.newaxis] + 1 + np.arange(numTrainSample)
+        train_X = self.windows[trainIndexes, :numFeature]
+        train_y = self.classData[trainIndexes - 1]
+        X = self.windows[trainStartIndexes, :numFeature][:, np.newaxis, :]
+        if standardization:
+            # --- Column j of day d is standardized by the window statistics at trainStartIndexes[d] + 1 + j.
+            mean, scale = self.standardizationStatistics(numTrainSample)
+            columnIndexes = trainStartIndexes[:, np.newaxis] + 1 + np.arange(numFeature)
+            mean = mean[columnIndexes][:, np.newaxis, :]
+            scale = scale[columnIndexes][:, np.newaxis, :]
+            train_X = (train_X - mean) / scale
+            X = (X - mean) / scale
+        return train_X, train_y, X
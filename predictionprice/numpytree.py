@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2016 Tylor Darden
+Released under the MIT license
+http://opensource.org/licenses/mit-license.php
+"""
+import numpy as np
+
+FEATURE_THRESHOLD = np.float32(1e-7)  # Same as sklearn: feature values closer than this are not split
+EPSILON = np.finfo(np.float64).eps
+
+
+def treeVotes(train_X, train_y, X, numTrial, maxBatchElements=2 ** 22):
+    """Return the votes of numTrial decision trees for every window as an array of shape (window, numTrial).
+    train_X, train_y and X are the training samples, teacher data (-1 or 1) and the feature vector to predict
+    of every window, of shape (window, sample, feature), (window, sample) and (window, 1, feature).
+    Each vote is distributed the same as DecisionTreeClassifier().fit(train_X[i], train_y[i]).predict(X[i]):
+    the gini split of the largest proxy improvement, ties between features broken at random and the first
+    threshold within a feature, on float32 features. Only the path of X through each tree is grown.
+    The windows are processed in chunks of at most maxBatchElements (tree, feature, sample) elements."""
+    train_X = np.asarray(train_X, dtype=np.float32)
+    train_y = np.asarray(train_y)
+    X = np.asarray(X, dtype=np.float32).reshape(train_X.shape[0], train_X.shape[2])
+    numWindow, numSample, numFeature = train_X.shape
+    windowsPerChunk = max(int(maxBatchElements // max(numTrial * numFeature * numSample, 1)), 1)
+    votes = [treeVotesChunk(train_X[start:start + windowsPerChunk], train_y[start:start + windowsPerChunk],
+                            X[start:start + windowsPerChunk], numTrial)
+             for start in range(0, numWindow, windowsPerChunk)]
+    return np.concatenate(votes, axis=0) if len(votes) > 0 else np.zeros((0, numTrial), dtype=int)
+
+
+def treeVotesChunk(train_X, train_y, X, numTrial):
+    """Return the votes of numTrial trees for every window of a chunk. See treeVotes()."""
+    numWindow, numSample, numFeature = train_X.shape
+    # --- Samples of every window sorted by each feature, as (window, feature, sample).
+    order = np.argsort(train_X, axis=1, kind="mergesort").transpose(0, 2, 1)
+    sortedX = np.take_along_axis(train_X.transpose(0, 2, 1), order, axis=2)
+    positive = train_y == 1
+    sortedPositive = positive[np.arange(numWindow)[:, np.newaxis, np.newaxis], order]
+
+    # --- Every tree starts at the root with all the samples of its window.
+    window = np.repeat(np.arange(numWindow), numTrial)
+    inNode = np.ones((len(window), numSample), dtype=bool)
+    votes = np.zeros(len(window), dtype=int)
+    active = np.arange(len(window))
+    while len(active) > 0:
+        w = window[active]
+        node = inNode[active]
+        n = node.sum(axis=1).astype(np.float64)
+        nPositive = (node & positive[w]).sum(axis=1).astype(np.float64)
+        nNegative = n - nPositive
+
+        # --- Proxy improvement of the split after each sorted sample of the node, the same arithmetic as sklearn's Gini.
+        sortedNode = node[np.arange(len(active))[:, np.newaxis, np.newaxis], order[w]]
+        values = sortedX[w]
+        nLeft = np.cumsum(sortedNode, axis=2).astype(np.float64)
+        nLeftPositive = np.cumsum(sortedNode & sortedPositive[w], axis=2).astype(np.float64)
+        nRight = n[:, np.newaxis, np.newaxis] - nLeft
+        nRightPositive = nPositive[:, np.newaxis, np.newaxis] - nLeftPositive
+        nextValues = np.minimum.accumulate(np.where(sortedNode, values, np.inf)[:, :, ::-1], axis=2)[:, :, ::-1]
+        nextValues = np.concatenate([nextValues[:, :, 1:], np.full(nextValues.shape[:2] + (1,), np.inf, dtype=np.float32)], axis=2)
+        valid = sortedNode & np.isfinite(nextValues) & (nextValues > values + FEATURE_THRESHOLD)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            impurityLeft = giniImpurity(nLeft - nLeftPositive, nLeftPositive, nLeft)
+            impurityRight = giniImpurity(nRight - nRightPositive, nRightPositive, nRight)
+            proxy = np.where(valid, -nRight * impurityRight - nLeft * impurityLeft, -np.inf)
+
+        # --- The first threshold of each feature, then a feature at random among the best ones.
+        position = np.argmax(proxy, axis=2)
+        featureProxy = np.take_along_axis(proxy, position[:, :, np.newaxis], axis=2)[:, :, 0]
+        bestProxy = np.max(featureProxy, axis=1)
+        keys = np.where(featureProxy == bestProxy[:, np.newaxis], np.random.random_sample(featureProxy.shape), -1.0)
+        feature = np.argmax(keys, axis=1)
+        rows = np.arange(len(active))
+        position = position[rows, feature]
+        threshold = values[rows, feature, position].astype(np.float64) / 2.0 + nextValues[rows, feature, position].astype(np.float64) / 2.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            improvement = (n / numSample) * (giniImpurity(nNegative, nPositive, n)
+                                             - nRight[rows, feature, position] / n * impurityRight[rows, feature, position]
+                                             - nLeft[rows, feature, position] / n * impurityLeft[rows, feature, position])
+
+        isLeaf = (n < 2) | (nPositive == 0) | (nNegative == 0) | (bestProxy == -np.inf) | (improvement + EPSILON < 0.0)
+        votes[active[isLeaf]] = np.where(nPositive[isLeaf] > nNegative[isLeaf], 1, -1)  # Ties go to the first class as sklearn
+
+        # --- Follow X to the child containing it.
+        split = ~isLeaf
+        w, feature, threshold = w[split], feature[split], threshold[split]
+        goLeft = X[w, feature].astype(np.float64) <= threshold
+        sampleLeft = train_X[w, :, feature].astype(np.float64) <= threshold[:, np.newaxis]
+        inNode[active[split]] = node[split] & (sampleLeft == goLeft[:, np.newaxis])
+        active = active[split]
+    return votes.reshape(numWindow, numTrial)
+
+
+def giniImpurity(nNegative, nPositive, n):
+    """Return the gini impurity of nodes of n samples computed in the same order of operations as sklearn."""
+    return 1.0 - (nNegative * nNegative + nPositive * nPositive) / (n * n)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2016 Tylor Darden
+Released under the MIT license
+http://opensource.org/licenses/mit-license.php
+"""
+import os
+import threading
+import traceback
+import multiprocessing
+from .predictionprice import PredictionPrice
+
+
+def _fitPredictionPrice(pp):
+    """Run back test and prediction of one pair in a pool worker process and return the fitted object."""
+    pp.fit(pp.appreciationRate_, pp.quantizer(pp.appreciationRate_))
+    return pp
+
+
+def _initOptimizationWorker(nice):
+    """Lower the priority of an optimization worker process so that it does not slow down the next bot routine."""
+    if nice and hasattr(os, "nice"):
+        os.nice(nice)
+
+
+def _optimizePredictionPrice(task):
+    """Run backTestOptimization of one pair in a pool worker process and return its pair.
+    workers of optimizationKwargs is ignored because a pool worker cannot start a process pool of its own."""
+    pp, optimizationKwargs = task
+    optimizationKwargs = dict(optimizationKwargs)
+    optimizationKwargs["workers"] = 1
+    pp.backTestOptimization(pp.appreciationRate_, pp.quantizer(pp.appreciationRate_), **optimizationKwargs)
+    return pp.currentPair
+
+
+class BotPipeline(object):
+    def __init__(self, currentPairs, pairKwargs=None, predictionWorkers=None, optimizationWorkers=1,
+                 optimizationNice=10, optimizationDeadline=None, optimizationKwargs=None, **kwargs):
+        """Staged bot routine of many currency pairs.
+        1. Chart data of every pair is fetched concurrently (PredictionPrice.fromPairs with kwargs and pairKwargs).
+        2. Back test and prediction of every pair run in a pool of predictionWorkers processes.
+        3. The trade callback gets every fitted PredictionPrice as soon as all of them are ready.
+        4. backTestOptimization of every pair runs in the background in a pool of optimizationWorkers processes
+           niced by optimizationNice, with optimizationKwargs other than workers. It is terminated after
+           optimizationDeadline seconds if it is given."""
+        self.currentPairs = currentPairs
+        self.pairKwargs = pairKwargs
+        self.predictionWorkers = predictionWorkers or max(min(len(currentPairs), multiprocessing.cpu_count()), 1)
+        self.optimizationWorkers = optimizationWorkers
+        self.optimizationNice = optimizationNice
+        self.optimizationDeadline = optimizationDeadline
+        self.optimizationKwargs = {} if optimizationKwargs is None else optimizationKwargs
+        self.kwargs = kwargs
+        self.optimizationPool = None
+        self.optimizationResults = []
+        self.optimizationTimer = None
+
+    def predict(self, onPrediction=None):
+        """Return fitted PredictionPrice of every pair in the order of currentPairs.
+        onPrediction(pp) is called in this process for each pair in that order as soon as it is fitted."""
+        ppList = PredictionPrice.fromPairs(self.currentPairs, self.pairKwargs, **self.kwargs)
+        pool = multiprocessing.Pool(self.predictionWorkers)
+        try:
+            fittedList = []
+            for pp in pool.imap(_fitPredictionPrice, ppList):
+                if onPrediction is not None:
+                    onPrediction(pp)
+                fittedList.append(pp)
+        finally:
+            pool.close()
+            pool.join()
+        return fittedList
+
+    def startOptimization(self, ppList):
+        """Start backTestOptimization of every pair in the background and return immediately."""
+        self.optimizationPool = multiprocessing.Pool(self.optimizationWorkers, _initOptimizationWorker, (self.optimizationNice,))
+        self.optimizationResults = [(pp.currentPair, self.optimizationPool.apply_async(_optimizePredictionPrice, ((pp, self.optimizationKwargs),)))
+                                    for pp in ppList]
+        self.optimizationPool.close()
+        if self.optimizationDeadline is not None:
+            self.optimizationTimer = threading.Timer(self.optimizationDeadline, self.terminateOptimization)
+            self.optimizationTimer.daemon = True
+            self.optimizationTimer.start()
+
+    def terminateOptimization(self):
+        """Kill the optimizations still running. Their pairs keep the result of the previous optimization."""
+        if self.optimizationPool is not None:
+            self.optimizationPool.terminate()
+
+    def waitOptimization(self):
+        """Wait for the background optimization and return {pair: "done", "terminated" or the error}."""
+        if self.optimizationPool is None:
+            return {}
+        self.optimizationPool.join()
+        if self.optimizationTimer is not None:
+            self.optimizationTimer.cancel()
+        status = {}
+        for pair, result in self.optimizationResults:
+            if not result.ready():
+                status[pair] = "terminated"
+                continue
+            try:
+                result.get()
+                status[pair] = "done"
+            except Exception:
+                status[pair] = traceback.format_exc()
+        self.optimizationPool = None
+        return status
+
+    def run(self, trade, onPrediction=None, waitOptimization=True):
+        """Predict every pair, call trade(ppList) and optimize in the background.
+        The optimization starts even if trade raises. Return fitted PredictionPrice list, the return value of trade
+        and the status of the optimization (None if waitOptimization is False, see waitOptimization())."""
+        ppList = self.predict(onPrediction)
+        try:
+            tradeResult = trade(ppList)
+        finally:
+            self.startOptimization(ppList)
+        return ppList, tradeResult, self.waitOptimization() if waitOptimization else None
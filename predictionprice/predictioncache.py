@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2016 Tylor Darden
+Released under the MIT license
+http://opensource.org/licenses/mit-license.php
+"""
+import time
+import hashlib
+from contextlib import closing
+import numpy as np
+from .sqlitefile import SqliteFile
+
+
+class PredictionCache(SqliteFile):
+    maxVariables = 500  # Keys per query, below the limit of SQLite on host parameters
+
+    def __init__(self, filePath, maxEntries=200000):
+        """Persistent cache of the predictions of every window in a SQLite file.
+        A prediction is stored under the hash of its training window, the window to predict and the prediction
+        settings, so any pair and any day with the same data hits it. The least recently used predictions are
+        evicted beyond maxEntries. Since the decision trees are random, a cached prediction is the first draw of them."""
+        super(PredictionCache, self).__init__(filePath)
+        self.maxEntries = maxEntries
+        with closing(self.connect()) as connection, connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS predictions "
+                               "(key TEXT PRIMARY KEY, prediction REAL NOT NULL, lastAccess REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS predictionsLastAccess ON predictions (lastAccess)")
+
+    def key(self, featureCache, trainStartIndex, numFeature, numTrainSample, settings):
+        """Return the key of the prediction at trainStartIndex from the data it depends on and settings (dict)."""
+        digest = hashlib.sha1()
+        # --- The training windows and the window to predict span these samples and teacher data.
+        digest.update(featureCache.sampleData[trainStartIndex:trainStartIndex + numTrainSample + numFeature].tobytes())
+        digest.update(np.asarray(featureCache.classData[trainStartIndex:trainStartIndex + numTrainSample], dtype=np.int64).tobytes())
+        digest.update(repr((int(numFeature), int(numTrainSample), sorted(settings.items()))).encode("utf-8"))
+        return digest.hexdigest()
+
+    def load(self, keys):
+        """Return {key: prediction} of the keys in the cache and mark them as used now."""
+        keys = list(set(keys))
+        predictions = {}
+        with closing(self.connect()) as connection, connection:
+            for start in range(0, len(keys), self.maxVariables):
+                chunk = keys[start:start + self.maxVariables]
+                placeholders = ", ".join(["?"] * len(chunk))
+                predictions.update(connection.execute("SELECT key, prediction FROM predictions WHERE key IN (" + placeholders + ")",
+                                                      chunk).fetchall())
+                connection.execute("UPDATE predictions SET lastAccess = ? WHERE key IN (" + placeholders + ")",
+                                   [time.time()] + chunk)
+        return predictions
+
+    def save(self, predictions):
+        """Insert or overwrite {key: prediction} and evict the least recently used beyond maxEntries."""
+        if len(predictions) == 0:
+            return
+        now = time.time()
+        with closing(self.connect()) as connection, connection:
+            connection.executemany("INSERT OR REPLACE INTO predictions (key, prediction, lastAccess) VALUES (?, ?, ?)",
+                                   [(key, float(prediction), now) for key, prediction in predictions.items()])
+            numEvicted = connection.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] - self.maxEntries
+            if numEvicted > 0:
+                connection.execute("DELETE FROM predictions WHERE key IN "
+                                   "(SELECT key FROM predictions ORDER BY lastAccess LIMIT ?)", (numEvicted,))
@@ -13,6 +13,7 @@ import smtplib
 import email
 import pickle
 import csv
+from multiprocessing.pool import ThreadPool
 import numpy as np
 import pandas as pd
 import matplotlib
@@ -20,27 +21,37 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 from sklearn import tree
-from sklearn.preprocessing import StandardScaler
-import poloniex
+from sklearn.ensemble import RandomForestClassifier
 import logging
+from .featurecache import FeatureCache
+from .candlestore import CandleStore
+from .predictioncache import PredictionCache
+from .numpytree import treeVotes
+from .derivedpoloniex.pooledpoloniex import sharedPublicPoloniex
+from .searchstrategy import BackTestEvaluator, GridSearch, IncrementalGridSearch
 
 
 class PredictionPrice(object):
     def __init__(self, currentPair="BTC_ETH", workingDirPath=".",
                  gmailAddress="", gmailAddressPassword="",
                  waitGettingTodaysChart=True, waitGettingTodaysChartTime=60,
+                 waitGettingTodaysChartInterval=20, waitGettingTodaysChartBackoff=1.0, waitGettingTodaysChartMaxInterval=300,
                  numFeature=30, numTrainSample=30, standardizationFeatureFlag=True, numStudyTrial=50,
+                 studyMode="serial", numStudyJobs=1,
                  useBackTestOptResult=True, backTestInitialFund=1000, backTestSpread=0, backTestDays=60,
                  backTestOptNumFeatureMin=20, backTestOptNumFeatureMax=40, backTestOptNumTrainSampleMin=20, backTestOptNumTrainSampleMax=40,
-                 marginTrade=False):
+                 marginTrade=False, useCandleStore=True, usePredictionCache=False, predictionCacheMaxEntries=200000):
 
         self.marginTrade = marginTrade
+        self.useCandleStore = useCandleStore
+        self.usePredictionCache = usePredictionCache
+        self.predictionCacheMaxEntries = predictionCacheMaxEntries
         self.currentPair = currentPair
         self.workingDirPath = workingDirPath
         self.useBackTestOptResult=useBackTestOptResult
-        if self.useBackTestOptResult and os.path.exists(self.workingDirPath + "/backTestOptResult_" + self.currentPair + ".pickle"):
-            with open(self.workingDirPath + "/backTestOptResult_" + self.currentPair + ".pickle", mode='rb') as f:
-                self.backTestOptResult_ = pickle.load(f)
+        backTestOptResult = self.loadBackTestOptResult() if self.useBackTestOptResult else None
+        if backTestOptResult is not None:
+            self.backTestOptResult_ = backTestOptResult
             self.numFeature = self.backTestOptResult_["numFeatureOpt"]
             self.numTrainSample = self.backTestOptResult_["numTrainSampleOpt"]
         else:
@@ -50,11 +61,21 @@ class PredictionPrice(object):
         self.standardizationFeatureFlag = standardizationFeatureFlag
 
         self.numStudyTrial = numStudyTrial
+        self.studyMode = studyMode  # "serial": numStudyTrial DecisionTreeClassifier fits, "ensemble": one forest fit,
+                                    # "numpytree": the trees of every back test day fitted at once by numpytree.treeVotes
+        self.numStudyJobs = numStudyJobs
+        if self.usePredictionCache:
+            self.predictionCache = PredictionCache(workingDirPath + "/predictionCache.sqlite3", predictionCacheMaxEntries)
+        else:
+            self.predictionCache = None
         self.gmailAddress = gmailAddress
         self.gmailAddressPassword = gmailAddressPassword
 
         self.waitGettingTodaysChart = waitGettingTodaysChart
         self.waitGettingTodaysChartTime = waitGettingTodaysChartTime
+        self.waitGettingTodaysChartInterval = waitGettingTodaysChartInterval
+        self.waitGettingTodaysChartBackoff = waitGettingTodaysChartBackoff
+        self.waitGettingTodaysChartMaxInterval = waitGettingTodaysChartMaxInterval
 
         self.backTestInitialFund = backTestInitialFund
         self.backTestSpread = backTestSpread
@@ -73,14 +94,44 @@ class PredictionPrice(object):
         self.chartDataLatestDayStr = str(self.chartData_.date[0])[0:10]
 
         if self.waitGettingTodaysChart:
-            for tmpIndex in range(int(self.waitGettingTodaysChartTime*60.0/20.0)):
-                if not (self.todayStr == self.chartDataLatestDayStr):
-                    time.sleep(20)
-                else:
-                    break
-                self.chartData_ = self.getChartData()
-                self.appreciationRate_ = self.getAppreciationRate(self.chartData_.open)
-                self.chartDataLatestDayStr = str(self.chartData_.date[0])[0:10]
+            # --- Poll only the latest candles with the interval growing by waitGettingTodaysChartBackoff.
+            deadline = time.time() + self.waitGettingTodaysChartTime * 60.0
+            interval = self.waitGettingTodaysChartInterval
+            while self.todayStr != self.chartDataLatestDayStr and time.time() + interval <= deadline:
+                time.sleep(interval)
+                interval = min(interval * self.waitGettingTodaysChartBackoff, self.waitGettingTodaysChartMaxInterval)
+                self.probeLatestCandle()
+
+    @classmethod
+    def fromPairs(cls, currentPairs, pairKwargs=None, workers=6, **kwargs):
+        """Construct PredictionPrice of every pair concurrently on up to workers threads and return them in the order of currentPairs.
+        kwargs are passed to every pair and pairKwargs[i] only to currentPairs[i].
+        Chart data requests of all pairs share the process-wide rate limiter (6 calls per second), so more workers do not help."""
+        if pairKwargs is None:
+            pairKwargs = [{}] * len(currentPairs)
+
+        def construct(pairIndex):
+            constructorKwargs = dict(kwargs)
+            constructorKwargs.update(pairKwargs[pairIndex])
+            return cls(currentPair=currentPairs[pairIndex], **constructorKwargs)
+
+        pool = ThreadPool(max(min(workers, len(currentPairs)), 1))
+        try:
+            return pool.map(construct, range(len(currentPairs)))
+        finally:
+            pool.close()
+            pool.join()
+
+    def loadBackTestOptResult(self):
+        """Return the result saved by backTestOptimization() or None if it has not been saved."""
+        if not os.path.exists(self.workingDirPath + "/backTestOptResult_" + self.currentPair + ".pickle"):
+            return None
+        with open(self.workingDirPath + "/backTestOptResult_" + self.currentPair + ".pickle", mode='rb') as f:
+            return pickle.load(f)
+
+    def getPoloniex(self):
+        """Return Poloniex client for chart data, shared by every pair to reuse its connections and rate limit."""
+        return sharedPublicPoloniex()
 
     def reverseDataFrame(self,dataFrame):
         """Reverse the index of chart data as last data comes first."""
@@ -89,12 +140,48 @@ class PredictionPrice(object):
         return dataFrame
 
     def getChartData(self):
-        """Get chart data."""
-        polo = poloniex.Poloniex(timeout = 10, coach = True, extend=True)
-        chartData = pd.DataFrame(polo.marketChart(self.currentPair, period=polo.DAY, start=time.time() - polo.DAY * 500,end=time.time())).astype(float)
+        """Get chart data of the last 500 days. With useCandleStore, history is read from the candle store
+        in workingDirPath and only the candles newer than the latest stored one are downloaded."""
+        polo = self.getPoloniex()
+        end = time.time()
+        start = end - polo.DAY * 500
+        if self.useCandleStore:
+            candleStore = CandleStore(self.workingDirPath + "/candleStore.sqlite3")
+            latestTimestamp = candleStore.latestTimestamp(self.currentPair, polo.DAY)
+            # --- Download from the latest stored candle again because it grows until the day ends.
+            fetchStart = start if latestTimestamp is None else max(start, latestTimestamp)
+            candleStore.saveCandles(self.currentPair, polo.DAY, polo.marketChart(self.currentPair, period=polo.DAY, start=fetchStart, end=end))
+            chartData = candleStore.loadCandles(self.currentPair, polo.DAY, start, end)
+        else:
+            chartData = pd.DataFrame(polo.marketChart(self.currentPair, period=polo.DAY, start=start, end=end)).astype(float)
         chartData.date = pd.DataFrame([datetime.datetime.fromtimestamp(chartData.date[i]).date() for i in range(len(chartData.date))])
         return self.reverseDataFrame(chartData)
 
+    def probeLatestCandle(self):
+        """Download only the candles of the last two days, merge them into the chart data and return the latest day."""
+        polo = self.getPoloniex()
+        end = time.time()
+        candles = polo.marketChart(self.currentPair, period=polo.DAY, start=end - polo.DAY * 2, end=end)
+        if self.useCandleStore:
+            CandleStore(self.workingDirPath + "/candleStore.sqlite3").saveCandles(self.currentPair, polo.DAY, candles)
+        self.chartData_ = self.mergeChartData(self.chartData_, candles)
+        self.appreciationRate_ = self.getAppreciationRate(self.chartData_.open)
+        self.chartDataLatestDayStr = str(self.chartData_.date[0])[0:10]
+        return self.chartDataLatestDayStr
+
+    def mergeChartData(self, chartData, candles):
+        """Return chart data updated by candles returned by returnChartData, keeping the number of days."""
+        latestChartData = pd.DataFrame([candle for candle in candles if float(candle["date"]) > 0])
+        if len(latestChartData) == 0:
+            return chartData
+        latestChartData = latestChartData.astype(float)
+        latestChartData.date = [datetime.datetime.fromtimestamp(date).date() for date in latestChartData.date]
+        numDays = len(chartData.index)
+        chartData = self.reverseDataFrame(chartData)  # Ascending order of date
+        chartData = pd.concat([chartData[~chartData.date.isin(latestChartData.date)], latestChartData])
+        chartData = chartData.sort_values("date").iloc[-numDays:]
+        return self.reverseDataFrame(chartData.reset_index(drop=True))
+
     def saveChartData(self,chartData):
         """Save chart data to a pickle file. You can load it with loadChartData() for debug."""
         with open("chartData_"+ self.currentPair + ".pickle", mode="wb") as f:
@@ -116,83 +203,139 @@ class PredictionPrice(object):
         return np.where(np.array(y) >= 0.0, 1, -1)
 
     def standardizationFeature(self, train_X, test_X):
-        """Standarize feature data."""
-        sc = StandardScaler()
-        train_X_std = sc.fit_transform(train_X)
-        test_X_std = sc.transform(test_X)
-        return train_X_std, test_X_std
-
-    def preparationTrainSample(self,sampleData,classData,trainStartIndex, numFeature, numTrainSample):
-        """Prepare training sample."""
-        train_X = []
-        train_y = []
-        for i in range(numTrainSample):
-            train_X.append(sampleData[trainStartIndex + i + 1:trainStartIndex + numFeature + i + 1])
-            train_y.append(classData[trainStartIndex + i])
-        return np.array(train_X), np.array(train_y)
-
-    def prediction(self, sampleData, classData, trainStartIndex, numFeature, numTrainSample):
-        """Return probability of price rise."""
-        train_X, train_y = self.preparationTrainSample(sampleData, classData, trainStartIndex, numFeature, numTrainSample)
-        X = np.array([sampleData[trainStartIndex:trainStartIndex + numFeature]])
-        if self.standardizationFeatureFlag:
-            train_X, X = self.standardizationFeature(train_X, X)
-        y = []
-        for i in range(0, self.numStudyTrial):
-            clf = tree.DecisionTreeClassifier()
+        """Standarize feature data by the mean and the standard deviation of train_X, the same as StandardScaler."""
+        train_X = np.asarray(train_X, dtype=np.float64)
+        mean = np.mean(train_X, axis=0)
+        scale = np.std(train_X, axis=0)
+        scale[scale < 10 * np.finfo(np.float64).eps] = 1.0
+        return (train_X - mean) / scale, (np.asarray(test_X, dtype=np.float64) - mean) / scale
+
+    def preparationTrainSample(self,sampleData,classData,trainStartIndex, numFeature, numTrainSample, featureCache=None):
+        """Prepare training sample. featureCache is a FeatureCache at least numFeature wide to be shared between calls."""
+        if featureCache is None:
+            featureCache = FeatureCache(sampleData, classData, numFeature)
+        return featureCache.trainSample(trainStartIndex, numFeature, numTrainSample)
+
+    def studyVotes(self, train_X, train_y, X):
+        """Return the votes (-1 or 1) of numStudyTrial decision trees trained on train_X for X."""
+        if self.studyMode == "ensemble":
+            # Without bootstrap and feature subsampling every tree of the forest is a DecisionTreeClassifier()
+            # differing only in its random state, so the votes follow the same distribution as the serial fits.
+            clf = RandomForestClassifier(n_estimators=self.numStudyTrial, bootstrap=False, max_features=None,
+                                         n_jobs=self.numStudyJobs)
             clf.fit(train_X, train_y)
-            y.append(clf.predict(X)[0])
-        return sum(y) * 1.0 / len(y)
+            leaves = clf.apply(X)[0]
+            return clf.classes_.take([np.argmax(estimator.tree_.value[leaf]) for estimator, leaf in zip(clf.estimators_, leaves)])
+        elif self.studyMode == "serial":
+            y = []
+            for i in range(0, self.numStudyTrial):
+                clf = tree.DecisionTreeClassifier()
+                clf.fit(train_X, train_y)
+                y.append(clf.predict(X)[0])
+            return np.array(y)
+        elif self.studyMode == "numpytree":
+            return treeVotes(np.asarray(train_X)[np.newaxis], np.asarray(train_y)[np.newaxis], np.asarray(X)[np.newaxis],
+                             self.numStudyTrial)[0]
+        else:
+            raise ValueError("Invalid studyMode: " + str(self.studyMode))
+
+    def predictionVotes(self, sampleData, classData, trainStartIndex, numFeature, numTrainSample, featureCache=None):
+        """Return the vote distribution of the decision trees on price rise (1) or fall (-1)."""
+        if featureCache is None:
+            featureCache = FeatureCache(sampleData, classData, numFeature)
+        if self.standardizationFeatureFlag:
+            train_X, train_y, X = featureCache.standardizedSample(trainStartIndex, numFeature, numTrainSample)
+        else:
+            train_X, train_y = self.preparationTrainSample(sampleData, classData, trainStartIndex, numFeature, numTrainSample, featureCache)
+            X = featureCache.testSample(trainStartIndex, numFeature)
+        return self.studyVotes(train_X, train_y, X)
+
+    def prediction(self, sampleData, classData, trainStartIndex, numFeature, numTrainSample, featureCache=None):
+        """Return probability of price rise."""
+        y = self.predictionVotes(sampleData, classData, trainStartIndex, numFeature, numTrainSample, featureCache)
+        return np.sum(y) * 1.0 / len(y)
+
+    def batchPredictions(self, trainStartIndexes, numFeature, numTrainSample, featureCache):
+        """Return the results of prediction() at every trainStartIndex from the samples of all of them prepared at once."""
+        train_X, train_y, X = featureCache.sampleBatch(trainStartIndexes, numFeature, numTrainSample, self.standardizationFeatureFlag)
+        if self.studyMode == "numpytree":
+            return list(np.mean(treeVotes(train_X, train_y, X, self.numStudyTrial), axis=1))
+        predictions = []
+        for day in range(len(train_X)):
+            y = self.studyVotes(train_X[day], train_y[day], X[day])
+            predictions.append(np.sum(y) * 1.0 / len(y))
+        return predictions
+
+    def predictions(self, sampleData, classData, trainStartIndexes, numFeature, numTrainSample, featureCache=None):
+        """Return the results of prediction() at every trainStartIndex as a list.
+        With usePredictionCache, the predictions are read from the prediction cache and only the missing ones are computed."""
+        if featureCache is None:
+            featureCache = FeatureCache(sampleData, classData, numFeature)
+        if self.predictionCache is None:
+            return self.batchPredictions(trainStartIndexes, numFeature, numTrainSample, featureCache)
+        settings = self.predictionSettings()
+        keys = [self.predictionCache.key(featureCache, trainStartIndex, numFeature, numTrainSample, settings)
+                for trainStartIndex in trainStartIndexes]
+        cachedPredictions = self.predictionCache.load(keys)
+        missingIndexes = {}
+        for key, trainStartIndex in zip(keys, trainStartIndexes):
+            if key not in cachedPredictions:
+                missingIndexes.setdefault(key, trainStartIndex)
+        missingKeys = list(missingIndexes.keys())
+        newPredictions = dict(zip(missingKeys, self.batchPredictions([missingIndexes[key] for key in missingKeys],
+                                                                     numFeature, numTrainSample, featureCache)))
+        self.predictionCache.save(newPredictions)
+        cachedPredictions.update(newPredictions)
+        return [cachedPredictions[key] for key in keys]
 
     def setTomorrowPriceProbability(self, sampleData, classData):
         """Set probability of price rise and buying signal to menber valiables."""
-        self.tomorrowPriceProbability_ = (self.prediction(sampleData, classData, 0, self.numFeature, self.numTrainSample) + 1.0) / 2.0
+        featureCache = FeatureCache(sampleData, classData, self.numFeature)
+        self.tomorrowPriceProbability_ = (self.predictions(sampleData, classData, [0], self.numFeature, self.numTrainSample, featureCache)[0] + 1.0) / 2.0
         if self.tomorrowPriceProbability_>0.5:
             self.tomorrowPriceFlag_ = True
         else:
             self.tomorrowPriceFlag_ = False
         return self.tomorrowPriceProbability_
 
-    def backTest(self, sampleData, classData, numFeature, numTrainSample, saveBackTestGraph):
-        """Do back test and return the result."""
-        Y = []
-        YPrediction = []
-        fund = [self.backTestInitialFund]
-        pastDay = 0
-        accuracyUp = 0
-        accuracyDown = 0
-        for trainStartIndex in range(self.backTestDays, 0, -1):
-            yPrediction = self.quantizer(self.prediction(sampleData, classData, trainStartIndex, numFeature, numTrainSample))
-            y = self.quantizer(classData[trainStartIndex - 1])
-            Y.append(y.tolist())
-            YPrediction.append(yPrediction.tolist())
-            pastDay += 1
-            if yPrediction == y:
-                if yPrediction == 1:
-                    accuracyUp += 1
-                    fund.append(fund[pastDay - 1] * (1 + abs(self.appreciationRate_[trainStartIndex - 1]) - self.backTestSpread))
-                else:
-                    accuracyDown += 1
-                    if self.marginTrade:
-                        fund.append(fund[pastDay - 1] * (1 + abs(self.appreciationRate_[trainStartIndex - 1]) - self.backTestSpread))
-                    else:
-                        fund.append(fund[pastDay - 1])
-            else:
-                if yPrediction == 1:
-                    fund.append(fund[pastDay - 1] * (1 - abs(self.appreciationRate_[trainStartIndex - 1]) - self.backTestSpread))
-                else:
-                    if self.marginTrade:
-                        fund.append(fund[pastDay - 1] * (1 - abs(self.appreciationRate_[trainStartIndex - 1]) - self.backTestSpread))
-                    else:
-                        fund.append(fund[pastDay - 1])
-
-        backTestAccuracyRateUp = float(accuracyUp) / sum(np.array(YPrediction)[np.where(np.array(YPrediction) == 1)])
-        backTestAccuracyRateDown = -float(accuracyDown) / sum(np.array(YPrediction)[np.where(np.array(YPrediction) == -1)])
+    def backTestPredictions(self, sampleData, classData, numFeature, numTrainSample, featureCache=None, backTestDays=None):
+        """Return the predicted and the actual price rise (1) or fall (-1) from backTestDays ago to today as arrays."""
+        if backTestDays is None:
+            backTestDays = self.backTestDays
+        if featureCache is None:
+            featureCache = FeatureCache(sampleData, classData, numFeature, [numTrainSample])
+        trainStartIndexes = np.arange(backTestDays, 0, -1)
+        YPrediction = self.quantizer(self.predictions(sampleData, classData, trainStartIndexes, numFeature, numTrainSample, featureCache))
+        Y = self.quantizer(np.asarray(classData)[trainStartIndexes - 1])
+        return YPrediction, Y
+
+    def backTestSimulation(self, YPrediction, Y):
+        """Return the fund trajectory, AccuracyRateUp and AccuracyRateDown of trading by the predictions of backTestPredictions()."""
+        YPrediction = np.asarray(YPrediction)
+        Y = np.asarray(Y)
+        appreciationRate = np.abs(self.appreciationRate_[np.arange(len(Y), 0, -1) - 1])
+        # --- Daily growth of the fund: gain the price change when the prediction is correct, lose it otherwise.
+        growth = np.where(YPrediction == Y, 1.0 + appreciationRate, 1.0 - appreciationRate) - self.backTestSpread
+        if not self.marginTrade:
+            growth = np.where(YPrediction == 1, growth, 1.0)  # Stay out of the market on fall signs
+        fund = np.cumprod(np.append(float(self.backTestInitialFund), growth))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            accuracyRateUp = np.float64(np.sum((YPrediction == 1) & (Y == 1))) / np.sum(YPrediction == 1)
+            accuracyRateDown = np.float64(np.sum((YPrediction == -1) & (Y == -1))) / np.sum(YPrediction == -1)
+        return fund, accuracyRateUp, accuracyRateDown
+
+    def backTest(self, sampleData, classData, numFeature, numTrainSample, saveBackTestGraph, featureCache=None, backTestDays=None):
+        """Do back test over the latest backTestDays(default: self.backTestDays) and return the result.
+        featureCache can be shared with other back tests on the same data."""
+        if backTestDays is None:
+            backTestDays = self.backTestDays
+        YPrediction, Y = self.backTestPredictions(sampleData, classData, numFeature, numTrainSample, featureCache, backTestDays)
+        fund, backTestAccuracyRateUp, backTestAccuracyRateDown = self.backTestSimulation(YPrediction, Y)
 
         trainStartIndex = 0
-        backTestCurrentPrice = self.chartData_.open[trainStartIndex:trainStartIndex + self.backTestDays + 1]
+        backTestCurrentPrice = self.chartData_.open[trainStartIndex:trainStartIndex + backTestDays + 1]
         backTestCurrentPrice = backTestCurrentPrice[::-1].tolist()
-        backTestDate = self.chartData_.date[trainStartIndex:trainStartIndex + self.backTestDays + 1]
+        backTestDate = self.chartData_.date[trainStartIndex:trainStartIndex + backTestDays + 1]
         backTestDate = backTestDate[::-1].tolist()
 
         backTestFinalFund = fund[-1]
@@ -224,26 +367,49 @@ class PredictionPrice(object):
             plt.close()
 
             self.backTestResult_ = backTestResult
+            self.backTestFund_ = fund
+            self.backTestYPrediction_ = YPrediction
+            self.backTestY_ = Y
 
         return backTestResult
 
-    def backTestOptimization(self, sampleData, classData):
-        """Optimize the number of features and training samples and save the results to a pickle file."""
+    def backTestGridCell(self, sampleData, classData, numFeature, numTrainSample, featureCache=None, backTestDays=None):
+        """Return IncreasedFundRatio of the back test with numFeature and numTrainSample."""
+        return self.backTest(sampleData, classData, numFeature, numTrainSample, False, featureCache,
+                             backTestDays)["IncreasedFundRatio"].values[0]
+
+    def predictionSettings(self):
+        """Return the settings other than the grid cell that the back test predictions depend on."""
+        return {"standardizationFeatureFlag": self.standardizationFeatureFlag, "numStudyTrial": self.numStudyTrial,
+                "studyMode": self.studyMode}
+
+    def incrementalSearchStrategy(self):
+        """Return IncrementalGridSearch from the saved result moved to the latest day of the chart data,
+        or GridSearch if no result has been saved."""
+        previousResult = self.loadBackTestOptResult()
+        if previousResult is None or "latestDayOpt" not in previousResult:
+            return GridSearch()
+        numNewDays = (self.chartData_.date[0] - previousResult["latestDayOpt"]).days
+        return IncrementalGridSearch(previousResult, numNewDays)
+
+    def backTestOptimization(self, sampleData, classData, workers=1, searchStrategy=None, incremental=False):
+        """Optimize the number of features and training samples and save the results to a pickle file.
+        searchStrategy is GridSearch(default), RandomSearch, SuccessiveHalvingSearch or ModelBasedSearch.
+        With incremental and no searchStrategy, the predictions saved by the last grid search are reused
+        and only the days newer than them are evaluated (see IncrementalGridSearch).
+        Grid cells are evaluated in a process pool when workers > 1."""
+        if searchStrategy is None:
+            searchStrategy = self.incrementalSearchStrategy() if incremental else GridSearch()
         X = np.arange(self.backTestOptNumFeatureMin, self.backTestOptNumFeatureMax + 1, 1)
         Y = np.arange(self.backTestOptNumTrainSampleMin, self.backTestOptNumTrainSampleMax + 1, 1)
         X, Y = np.meshgrid(X, Y)
-        Z = np.zeros([len(Y[:]), len(X[0])])
-
-        for i in range(0, len(X[0])):
-            for j in range(0, len(Y[:])):
-                Z[j][i] = self.backTest(sampleData, classData, X[j][i], Y[j][i], False)["IncreasedFundRatio"].values[0]
-                #--- print("-" * 80)
-                #--- print("NumFeatur: " + str(X[j][i]))
-                #--- print("NumTrainSample: " + str(Y[j][i]))
-                #--- print("IncreasedFundRatio[%]: " + str(round(Z[j][i] * 100, 1)))
+        evaluator = BackTestEvaluator(self, sampleData, classData, np.max(X), np.unique(Y).tolist(), workers)
+        try:
+            Z = searchStrategy.search(evaluator, X, Y)  # NaN on the cells the strategy did not evaluate
+        finally:
+            evaluator.close()
 
-        maxZRow = np.where(Z == np.max(Z))[0][0]
-        maxZCol = np.where(Z == np.max(Z))[1][0]
+        maxZRow, maxZCol = np.unravel_index(np.nanargmax(Z), Z.shape)
 
         numFeatureOpt = X[maxZRow][maxZCol]
         numTrainSampleOpt = Y[maxZRow][maxZCol]
@@ -251,8 +417,18 @@ class PredictionPrice(object):
 
         backTestOptResult = {"X": X, "Y": Y, "Z": Z, "numFeatureOpt": numFeatureOpt,
                              "numTrainSampleOpt": numTrainSampleOpt, "dateOpt": dateOpt}
-        with open(self.workingDirPath + "/backTestOptResult_" + self.currentPair + ".pickle", mode='wb') as f:
+        if getattr(searchStrategy, "YPrediction_", None) is not None:
+            # --- Per-day predictions of every cell for the incremental optimization of the following days
+            backTestOptResult.update({"YPrediction": searchStrategy.YPrediction_.astype(np.int8),
+                                      "latestDayOpt": self.chartData_.date[0],
+                                      "predictionSettings": self.predictionSettings()})
+        # --- Write a temporary file and rename it, so that an optimization killed while writing keeps the last result.
+        fileName = self.workingDirPath + "/backTestOptResult_" + self.currentPair + ".pickle"
+        with open(fileName + "." + str(os.getpid()) + ".tmp", mode='wb') as f:
             pickle.dump(backTestOptResult, f)
+        if os.name == "nt" and os.path.exists(fileName):
+            os.remove(fileName)  # os.rename does not overwrite on Windows
+        os.rename(fileName + "." + str(os.getpid()) + ".tmp", fileName)
 
         print("-" * 30 + " Optimization Result " + "-" * 30)
         print("NumFeatur: " + str(numFeatureOpt))
@@ -261,8 +437,12 @@ class PredictionPrice(object):
 
         fig = plt.figure()
         ax = Axes3D(fig)
-        ax.plot_surface(X, Y, Z, rstride=1, cstride=1, cmap=plt.cm.hot)
-        ax.contourf(X, Y, Z, zdir="z", offset=-2, cmap=plt.cm.hot)
+        if np.isnan(Z).any():
+            evaluated = ~np.isnan(Z)
+            ax.scatter(X[evaluated], Y[evaluated], Z[evaluated], c=Z[evaluated], cmap=plt.cm.hot)
+        else:
+            ax.plot_surface(X, Y, Z, rstride=1, cstride=1, cmap=plt.cm.hot)
+            ax.contourf(X, Y, Z, zdir="z", offset=-2, cmap=plt.cm.hot)
         ax.set_title("Back test optimization (" + self.currentPair + ")")
         ax.set_xlabel("NumFeatur")
         ax.set_ylabel("NumTrainSample")
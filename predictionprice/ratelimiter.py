@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2016 Tylor Darden
+Released under the MIT license
+http://opensource.org/licenses/mit-license.php
+"""
+import threading
+import time
+
+
+class TokenBucket(object):
+    def __init__(self, rate, capacity=1):
+        """Bucket refilled with rate tokens per second up to capacity tokens.
+        It allows a burst of capacity calls and then one call every 1 / rate seconds, so capacity 1 spaces calls evenly.
+        The bucket keeps the time its next token is free, so calls can be taken at times in the future."""
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.nextFree = 0.0
+
+    def earliest(self, at):
+        """Return the earliest time not before at when a token is available. The caller has to hold the lock."""
+        return max(at, self.nextFree - (self.capacity - 1.0) / self.rate)
+
+    def take(self, at):
+        """Take one token for a call sent at at, a time returned by earliest(). The caller has to hold the lock."""
+        self.nextFree = max(self.nextFree, at) + 1.0 / self.rate
+
+
+class RateLimiter(object):
+    def __init__(self, callsPerSecond=6, classCallsPerSecond=None):
+        """Token bucket rate limiter to be shared by every client, thread and asyncio task of the process.
+        Every call takes a token of the total bucket (Poloniex: 6 calls per second) and of the bucket of its
+        command class ("public", "private" or "trading") in classCallsPerSecond, e.g. {"trading": 2}.
+        Poloniex has no limit per class, so by default there are no class buckets and only the total limits calls."""
+        if classCallsPerSecond is None:
+            classCallsPerSecond = {}
+        self.totalBucket = TokenBucket(callsPerSecond)
+        self.classBuckets = dict([(commandClass, TokenBucket(rate)) for commandClass, rate in classCallsPerSecond.items()])
+        self.statistics = {}
+        self.lock = threading.Lock()
+
+    def reserve(self, commandClass="public"):
+        """Reserve a call and return seconds the caller has to wait before it.
+        asyncio tasks should call this and then await asyncio.sleep() of the returned seconds."""
+        with self.lock:
+            now = time.time()
+            # --- Both buckets are taken at the same send time: the class wait first, then the total from there.
+            sendTime = now
+            if commandClass in self.classBuckets:
+                sendTime = self.classBuckets[commandClass].earliest(sendTime)
+            sendTime = self.totalBucket.earliest(sendTime)
+            self.totalBucket.take(sendTime)
+            if commandClass in self.classBuckets:
+                self.classBuckets[commandClass].take(sendTime)
+            waitTime = sendTime - now
+            statistics = self.statistics.setdefault(commandClass, {"calls": 0, "totalWait": 0.0, "maxWait": 0.0, "lastWait": 0.0})
+            statistics["calls"] += 1
+            statistics["totalWait"] += waitTime
+            statistics["maxWait"] = max(statistics["maxWait"], waitTime)
+            statistics["lastWait"] = waitTime
+            return waitTime
+
+    def wait(self, commandClass="public"):
+        """Sleep the calling thread until its call is within the limit and return the seconds waited."""
+        waitTime = self.reserve(commandClass)
+        if waitTime > 0:
+            time.sleep(waitTime)
+        return waitTime
+
+    def waitStatistics(self):
+        """Return the number of calls and the total, max and last wait seconds of each command class."""
+        with self.lock:
+            return dict([(commandClass, dict(statistics)) for commandClass, statistics in self.statistics.items()])
+
+
+sharedRateLimiter = RateLimiter()
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2016 Tylor Darden
+Released under the MIT license
+http://opensource.org/licenses/mit-license.php
+"""
+import multiprocessing
+import numpy as np
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import ConstantKernel, Matern, WhiteKernel
+from .featurecache import FeatureCache
+
+
+_backTestWorkerState = {}
+
+
+def _initBackTestWorker(predictionPrice, sampleData, classData, maxNumFeature, numTrainSamples):
+    """Keep the PredictionPrice object, chart data and its feature cache in a pool worker process once."""
+    _backTestWorkerState["predictionPrice"] = predictionPrice
+    _backTestWorkerState["sampleData"] = sampleData
+    _backTestWorkerState["classData"] = classData
+    _backTestWorkerState["featureCache"] = FeatureCache(sampleData, classData, maxNumFeature, numTrainSamples)
+
+
+def _backTestWorker(task):
+    """Return IncreasedFundRatio of one grid cell in a pool worker process."""
+    numFeature, numTrainSample, backTestDays = task
+    return _backTestWorkerState["predictionPrice"].backTestGridCell(
+        _backTestWorkerState["sampleData"], _backTestWorkerState["classData"], numFeature, numTrainSample,
+        _backTestWorkerState["featureCache"], backTestDays)
+
+
+def _backTestPredictionWorker(task):
+    """Return the predictions of the latest days of one grid cell in a pool worker process."""
+    numFeature, numTrainSample, latestDays = task
+    return _backTestWorkerState["predictionPrice"].backTestPredictions(
+        _backTestWorkerState["sampleData"], _backTestWorkerState["classData"], numFeature, numTrainSample,
+        _backTestWorkerState["featureCache"], latestDays)[0]
+
+
+class BackTestEvaluator(object):
+    def __init__(self, predictionPrice, sampleData, classData, maxNumFeature, numTrainSamples, workers=1):
+        """Evaluate IncreasedFundRatio of back tests on grid cells, serially or in a process pool.
+        Every cell slices one FeatureCache built at the largest grid size."""
+        self.predictionPrice = predictionPrice
+        self.sampleData = sampleData
+        self.classData = classData
+        self.backTestDays = predictionPrice.backTestDays
+        self.numEvaluation = 0.0  # Cost spent in units of back tests over the whole backTestDays
+        if workers > 1:
+            # --- The chart data goes to each worker once by the initializer, only grid cells go through the queue.
+            self.pool = multiprocessing.Pool(workers, _initBackTestWorker,
+                                             (predictionPrice, sampleData, classData, maxNumFeature, numTrainSamples))
+            self.featureCache = None
+        else:
+            self.pool = None
+            self.featureCache = FeatureCache(sampleData, classData, maxNumFeature, numTrainSamples)
+
+    def evaluate(self, cells, backTestDays=None):
+        """Return IncreasedFundRatio of the back tests over backTestDays on cells [(numFeature, numTrainSample), ...]."""
+        if backTestDays is None:
+            backTestDays = self.backTestDays
+        tasks = [(int(numFeature), int(numTrainSample), int(backTestDays)) for numFeature, numTrainSample in cells]
+        if self.pool is not None:
+            scores = self.pool.map(_backTestWorker, tasks)
+        else:
+            scores = [self.predictionPrice.backTestGridCell(self.sampleData, self.classData, numFeature, numTrainSample,
+                                                            self.featureCache, days)
+                      for numFeature, numTrainSample, days in tasks]
+        self.numEvaluation += len(tasks) * float(backTestDays) / self.backTestDays
+        return np.array(scores, dtype=float)
+
+    def evaluatePredictions(self, cells, latestDays=None):
+        """Return the predicted price rise (1) or fall (-1) of cells [(numFeature, numTrainSample), ...]
+        on the latest latestDays(default: backTestDays) days as an array of (cell, day) from the oldest day."""
+        if latestDays is None:
+            latestDays = self.backTestDays
+        tasks = [(int(numFeature), int(numTrainSample), int(latestDays)) for numFeature, numTrainSample in cells]
+        if len(tasks) == 0 or latestDays == 0:
+            return np.zeros((len(tasks), int(latestDays)), dtype=int)
+        if self.pool is not None:
+            predictions = self.pool.map(_backTestPredictionWorker, tasks)
+        else:
+            predictions = [self.predictionPrice.backTestPredictions(self.sampleData, self.classData, numFeature, numTrainSample,
+                                                                    self.featureCache, days)[0]
+                           for numFeature, numTrainSample, days in tasks]
+        self.numEvaluation += len(tasks) * float(latestDays) / self.backTestDays
+        return np.array(predictions, dtype=int)
+
+    def score(self, predictions):
+        """Return IncreasedFundRatio of the back tests over backTestDays trading by predictions of (cell, day)."""
+        trainStartIndexes = np.arange(self.backTestDays, 0, -1)
+        Y = self.predictionPrice.quantizer(np.asarray(self.classData)[trainStartIndexes - 1])
+        initialFund = float(self.predictionPrice.backTestInitialFund)
+        return np.array([(self.predictionPrice.backTestSimulation(YPrediction, Y)[0][-1] - initialFund) / initialFund
+                         for YPrediction in predictions], dtype=float)
+
+    def close(self):
+        """Shut down the process pool."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+class GridSearch(object):
+    """Evaluate every cell of the grid.
+    The predictions of every cell on every back test day are kept in YPrediction_ of shape X.shape + (backTestDays,)
+    for IncrementalGridSearch of the following days."""
+
+    def search(self, evaluator, X, Y):
+        """Return IncreasedFundRatio surface Z on the meshgrid X(numFeature), Y(numTrainSample)."""
+        predictions = evaluator.evaluatePredictions(list(zip(X.ravel(), Y.ravel())))
+        self.YPrediction_ = predictions.reshape(X.shape + (evaluator.backTestDays,))
+        return evaluator.score(predictions).reshape(X.shape)
+
+
+class IncrementalGridSearch(GridSearch):
+    def __init__(self, previousResult, numNewDays):
+        """Evaluate every cell of the grid only on the numNewDays days that have come since previousResult,
+        the back test optimization result saved with YPrediction of GridSearch or IncrementalGridSearch.
+        The predictions of the other days are moved by numNewDays days from previousResult and Z is recomputed from them.
+        The whole grid is evaluated when previousResult was made on another grid, back test days or prediction settings."""
+        self.previousResult = previousResult
+        self.numNewDays = numNewDays
+
+    def isReusable(self, evaluator, X, Y):
+        """Return True if the predictions of previousResult can be moved onto the grid X, Y of evaluator."""
+        previousResult = self.previousResult
+        if previousResult is None or "YPrediction" not in previousResult or "predictionSettings" not in previousResult:
+            return False
+        if not np.array_equal(previousResult["X"], X) or not np.array_equal(previousResult["Y"], Y):
+            return False
+        if np.shape(previousResult["YPrediction"]) != X.shape + (evaluator.backTestDays,):
+            return False
+        return previousResult["predictionSettings"] == evaluator.predictionPrice.predictionSettings() \
+            and 0 <= self.numNewDays < evaluator.backTestDays
+
+    def search(self, evaluator, X, Y):
+        """Return IncreasedFundRatio surface Z on the meshgrid X(numFeature), Y(numTrainSample)."""
+        if not self.isReusable(evaluator, X, Y):
+            return super(IncrementalGridSearch, self).search(evaluator, X, Y)
+        backTestDays = evaluator.backTestDays
+        previousPredictions = np.asarray(self.previousResult["YPrediction"]).reshape(X.size, backTestDays)
+        predictions = np.empty((X.size, backTestDays), dtype=int)
+        predictions[:, :backTestDays - self.numNewDays] = previousPredictions[:, self.numNewDays:]  # Drop the oldest days
+        predictions[:, backTestDays - self.numNewDays:] = evaluator.evaluatePredictions(list(zip(X.ravel(), Y.ravel())),
+                                                                                       self.numNewDays)
+        self.YPrediction_ = predictions.reshape(X.shape + (backTestDays,))
+        return evaluator.score(predictions).reshape(X.shape)
+
+
+class RandomSearch(object):
+    def __init__(self, budget=50, seed=None):
+        """Evaluate budget cells drawn at random without replacement."""
+        self.budget = budget
+        self.seed = seed
+
+    def search(self, evaluator, X, Y):
+        """Return IncreasedFundRatio surface Z, NaN for cells not evaluated."""
+        randomState = np.random.RandomState(self.seed)
+        Z = np.full(X.shape, np.nan)
+        indexes = randomState.permutation(X.size)[:min(int(self.budget), X.size)]
+        Z.flat[indexes] = evaluator.evaluate(list(zip(X.flat[indexes], Y.flat[indexes])))
+        return Z
+
+
+class SuccessiveHalvingSearch(object):
+    def __init__(self, budget=50, minBackTestDays=10, eta=3, seed=None):
+        """Evaluate many cells over the latest minBackTestDays, keep the best 1/eta of them
+        and multiply the days by eta until the whole backTestDays.
+        budget is the cost in units of back tests over the whole backTestDays."""
+        self.budget = budget
+        self.minBackTestDays = minBackTestDays
+        self.eta = eta
+        self.seed = seed
+
+    def rungs(self, numCandidate, backTestDays):
+        """Return [(the number of candidates, backTestDays), ...] of each rung."""
+        rungs = []
+        days = min(self.minBackTestDays, backTestDays)
+        while True:
+            rungs.append((numCandidate, days))
+            if days >= backTestDays:
+                return rungs
+            numCandidate = max(int(np.ceil(numCandidate * 1.0 / self.eta)), 1)
+            days = min(days * self.eta, backTestDays)
+
+    def search(self, evaluator, X, Y):
+        """Return IncreasedFundRatio surface Z over the whole backTestDays, NaN for cells eliminated or not evaluated."""
+        randomState = np.random.RandomState(self.seed)
+        backTestDays = evaluator.backTestDays
+        numCandidate = X.size
+        while numCandidate > 1 and sum([n * d for n, d in self.rungs(numCandidate, backTestDays)]) > self.budget * backTestDays:
+            numCandidate -= 1
+        indexes = randomState.permutation(X.size)[:numCandidate]
+        for numKeep, days in self.rungs(numCandidate, backTestDays):
+            indexes = indexes[:numKeep]
+            scores = evaluator.evaluate(list(zip(X.flat[indexes], Y.flat[indexes])), days)
+            order = np.argsort(-scores, kind="mergesort")
+            indexes, scores = indexes[order], scores[order]
+        Z = np.full(X.shape, np.nan)
+        Z.flat[indexes] = scores
+        return Z
+
+
+class ModelBasedSearch(object):
+    def __init__(self, budget=50, numInitial=10, batchSize=5, kappa=1.0, seed=None):
+        """Evaluate numInitial random cells, then repeatedly fit a Gaussian process to the evaluated cells
+        and evaluate the batchSize cells of the highest upper confidence bound (mean + kappa * std)."""
+        self.budget = budget
+        self.numInitial = numInitial
+        self.batchSize = batchSize
+        self.kappa = kappa
+        self.seed = seed
+
+    def search(self, evaluator, X, Y):
+        """Return IncreasedFundRatio surface Z, NaN for cells not evaluated."""
+        randomState = np.random.RandomState(self.seed)
+        budget = min(int(self.budget), X.size)
+        points = np.column_stack([X.ravel(), Y.ravel()]).astype(float)
+        points = (points - points.min(axis=0)) / np.maximum(np.ptp(points, axis=0), 1.0)
+        Z = np.full(X.shape, np.nan)
+        indexes = randomState.permutation(X.size)[:min(self.numInitial, budget)]
+        while True:
+            Z.flat[indexes] = evaluator.evaluate(list(zip(X.flat[indexes], Y.flat[indexes])))
+            evaluated = ~np.isnan(Z.ravel())
+            numRest = budget - np.sum(evaluated)
+            if numRest <= 0:
+                return Z
+            kernel = ConstantKernel() * Matern(length_scale=0.2, nu=2.5) + WhiteKernel()
+            gp = GaussianProcessRegressor(kernel=kernel, normalize_y=True, random_state=randomState)
+            gp.fit(points[evaluated], Z.ravel()[evaluated])
+            candidates = np.where(~evaluated)[0]
+            mean, std = gp.predict(points[candidates], return_std=True)
+            indexes = candidates[np.argsort(-(mean + self.kappa * std), kind="mergesort")[:min(self.batchSize, numRest)]]
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2016 Tylor Darden
+Released under the MIT license
+http://opensource.org/licenses/mit-license.php
+"""
+import sqlite3
+
+
+class SqliteFile(object):
+    def __init__(self, filePath):
+        """Base of the stores kept in a SQLite file."""
+        self.filePath = filePath
+
+    def connect(self):
+        """Return a new connection. Each call opens its own so that threads and processes can share the file."""
+        return sqlite3.connect(self.filePath, timeout=30)